@@ -1,5 +1,5 @@
 # Copyright(C) Facebook, Inc. and its affiliates.
-from re import search
+from re import findall, search
 from collections import defaultdict
 from statistics import mean, stdev
 from glob import glob
@@ -51,23 +51,36 @@ class Setup:
 
 
 class Result:
-    def __init__(self, mean_tps, mean_latency, std_tps=0, std_latency=0):
+    def __init__(self, mean_tps, mean_latency, std_tps=0, std_latency=0, percentiles=None):
         self.mean_tps = mean_tps
         self.mean_latency = mean_latency
         self.std_tps = std_tps
         self.std_latency = std_latency
+        self.percentiles = percentiles
 
     def __str__(self):
+        percentiles = ''
+        if self.percentiles:
+            values = ', '.join(f'{k} {v} ms' for k, v in self.percentiles.items())
+            percentiles = f' Latency percentiles: {values}\n'
         return(
             f' TPS: {self.mean_tps} +/- {self.std_tps} tx/s\n'
             f' Latency: {self.mean_latency} +/- {self.std_latency} ms\n'
+            f'{percentiles}'
         )
 
     @classmethod
     def from_str(cls, raw):
         tps = int(search(r'End-to-end TPS: (\d+)', raw).group(1))
         latency = int(search(r'End-to-end latency: (\d+)', raw).group(1))
-        return cls(tps, latency)
+        # Summaries written before percentiles were reported do not have them.
+        percentiles = search(r'End-to-end latency percentiles: (.*)', raw)
+        if percentiles is not None:
+            percentiles = {
+                k: int(v.replace(',', ''))
+                for k, v in findall(r'(p[\d.]+|max) ([\d,]+) ms', percentiles.group(1))
+            }
+        return cls(tps, latency, percentiles=percentiles or None)
 
     @classmethod
     def aggregate(cls, results):
@@ -78,7 +91,16 @@ class Result:
         mean_latency = round(mean([x.mean_latency for x in results]))
         std_tps = round(stdev([x.mean_tps for x in results]))
         std_latency = round(stdev([x.mean_latency for x in results]))
-        return cls(mean_tps, mean_latency, std_tps, std_latency)
+
+        # Percentiles are averaged over the runs that report them, except max.
+        percentiles = {}
+        for x in results:
+            for k, v in (x.percentiles or {}).items():
+                percentiles.setdefault(k, []).append(v)
+        percentiles = {
+            k: max(v) if k == 'max' else round(mean(v)) for k, v in percentiles.items()
+        }
+        return cls(mean_tps, mean_latency, std_tps, std_latency, percentiles or None)
 
 
 class LogAggregator:
@@ -248,6 +248,12 @@ class BenchParameters:
             self.runs = int(json['runs']) if 'runs' in json else 1
 
             self.burst = json['burst']
+
+            # Optional: time series bucket size and the seconds left out of the headline
+            # numbers at the start and end of each run (see LogParser).
+            self.series_interval = float(json.get('series_interval', 1))
+            self.warmup = float(json.get('warmup', 0))
+            self.cooldown = float(json.get('cooldown', 0))
             
         except KeyError as e:
             raise ConfigError(f'Malformed bench parameters: missing key {e}')
@@ -258,6 +264,9 @@ class BenchParameters:
         if min(self.nodes) <= self.faults:
             raise ConfigError('There should be more nodes than faults')
 
+        if self.series_interval <= 0 or self.warmup < 0 or self.cooldown < 0:
+            raise ConfigError('Invalid time series interval or warm-up/cool-down')
+
 
 class PlotParameters:
     def __init__(self, json):
@@ -121,7 +121,17 @@ class LocalBench:
 
             # Parse logs and return the parser.
             Print.info('Parsing logs...')
-            return LogParser.process(PathMaker.logs_path(), self.bench_parameters.burst, faults=self.faults, )
+            logger = LogParser.process(
+                PathMaker.logs_path(),
+                self.bench_parameters.burst,
+                faults=self.faults,
+                warmup=self.warmup,
+                cooldown=self.cooldown,
+            )
+            logger.print_series(PathMaker.series_file(
+                self.faults, nodes, self.workers, True, rate, self.tx_size, self.burst, 0
+            ), self.series_interval)
+            return logger
 
         except (subprocess.SubprocessError, ParseError) as e:
             self._kill_nodes()
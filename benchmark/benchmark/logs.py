@@ -1,11 +1,14 @@
 # Copyright(C) Facebook, Inc. and its affiliates.
+from array import array
 from datetime import datetime
 from glob import glob
+from math import ceil, inf
 from multiprocessing import Pool
-from os.path import join
-from re import findall, search
+from os import rename
+from os.path import exists, getsize, join, splitext
 from statistics import mean
 import csv
+import re
 from benchmark.utils import Print
 
 
@@ -13,8 +16,97 @@ class ParseError(Exception):
     pass
 
 
+# Logs are read line by line and each line is classified by one combined pattern per log kind,
+# so parsing is a single pass and memory does not grow with the size of the logs.
+CLIENT_LINE = re.compile(
+    r'\[(?P<time>.*Z) .* (?:(?P<start>Start )|sample transaction (?P<sample>\d+))'
+    r'|Transactions size: (?P<size>\d+)'
+    r'|Transactions rate: (?P<rate>\d+)'
+    r'|(?P<miss>rate too high)'
+)
+PRIMARY_LINE = re.compile(
+    r'\[(?P<time>.*Z) .* (?P<event>Created|Committed) B\d+\([^ ]+\) -> (?P<digest>[^ ]+=)'
+    r'(?: (?P<leader>Leader|NonLeader))?'
+    r'|(?P<config>Header size|Max header delay|Garbage collection depth|Sync retry delay'
+    r'|Sync retry nodes|Batch size|Max batch delay) .* (?P<value>\d+)'
+    r'|booted on (?P<ip>\d+.\d+.\d+.\d+)'
+)
+WORKER_LINE = re.compile(
+    r'Batch (?P<digest>[^ ]+) contains (?:(?P<size>\d+) B|sample tx (?P<sample>\d+))'
+    r'|booted on (?P<ip>\d+.\d+.\d+.\d+)'
+)
+PRIMARY_CONFIGS = {
+    'Header size': 'header_size',
+    'Max header delay': 'max_header_delay',
+    'Garbage collection depth': 'gc_depth',
+    'Sync retry delay': 'sync_retry_delay',
+    'Sync retry nodes': 'sync_retry_nodes',
+    'Batch size': 'batch_size',
+    'Max batch delay': 'max_batch_delay',
+}
+
+
+def _pack(mapping, key_type, value_type):
+    """A parse result as (keys, values) for the trip back from the pool: numbers go into
+    arrays of the given type code, digests stay a list of strings."""
+    keys = array(key_type, mapping.keys()) if key_type else list(mapping.keys())
+    values = array(value_type, mapping.values()) if value_type else list(mapping.values())
+    return keys, values
+
+
+def _unpack(packed):
+    """The (key, value) pairs of a packed parse result."""
+    return zip(*packed)
+
+
+def _lines(filename, pattern, panics, who):
+    """Matches of `pattern` in the log file, one line at a time. A line containing any of the
+    `panics` strings fails the parse."""
+    with open(filename, 'r') as f:
+        for line in f:
+            if any(p in line for p in panics):
+                raise ParseError(f'{who} panicked')
+            match = pattern.search(line)
+            if match is not None:
+                yield match
+
+
+def _found(value, what, filename):
+    if value is None:
+        raise ParseError(f'No {what} in {filename}')
+    return value
+
+
+# Columns of the time series written by LogParser.print_series.
+SERIES_COLUMNS = [
+    'Time', 'Proposals', 'Commits', 'Committed Bps', 'Committed Tps', 'Consensus Latency', 'E2E Latency'
+]
+
+# Latency percentiles reported next to the means, by nearest rank over the sorted samples.
+PERCENTILES = (50, 90, 99, 99.9)
+
+
+def _mean(samples):
+    return mean(samples) if samples else 0
+
+
+def latency_percentiles(samples):
+    """ p50 ... p99.9 and max of latency samples in seconds, as whole ms. """
+    ordered = sorted(samples) or [0]
+    # Rounded first so that e.g. p99.9 of 1,000 samples is rank 999, not 1,000.
+    ranks = [max(ceil(round(p * len(ordered) / 100, 6)), 1) for p in PERCENTILES]
+    values = {f'p{p:g}': ordered[r - 1] for p, r in zip(PERCENTILES, ranks)}
+    values['max'] = ordered[-1]
+    return {k: round(v * 1_000) for k, v in values.items()}
+
+
+def _format(percentiles):
+    return ', '.join(f'{k} {v:,} ms' for k, v in percentiles.items())
+
+
 class LogParser:
-    def __init__(self, clients, primaries, workers, burst, faults=0):
+    def __init__(self, clients, primaries, workers, burst, faults=0, warmup=0, cooldown=0):
+        # Paths of the clients', primaries' and workers' log files.
         inputs = [clients, primaries, workers]
         assert all(isinstance(x, list) for x in inputs)
         assert all(isinstance(x, str) for y in inputs for x in y)
@@ -29,42 +121,61 @@ class LogParser:
             self.committee_size = '?'
             self.workers = '?'
 
-        # Parse the clients logs.
-        try:
-            with Pool() as p:
-                results = p.map(self._parse_clients, clients)
-        except (ValueError, IndexError, AttributeError) as e:
-            raise ParseError(f'Failed to parse clients\' logs: {e}')
-        self.size, self.rate, self.start, misses, self.sent_samples \
-            = zip(*results)
-        self.misses = sum(misses)
-
-        # Parse the primaries logs.
-        try:
-            with Pool() as p:
-                results = p.map(self._parse_primaries, primaries)
-        except (ValueError, IndexError, AttributeError) as e:
-            raise ParseError(f'Failed to parse nodes\' logs: {e}')
-        proposals, commits, self.configs, primary_ips, leader_commits, non_leader_commits = zip(*results)
-        self.proposals = self._merge_results([x.items() for x in proposals])
-        self.commits = self._merge_results([x.items() for x in commits])
-        self.leader_commits = self._merge_results([x.items() for x in leader_commits])
-        self.non_leader_commits = self._merge_results([x.items() for x in non_leader_commits])
-
-        # Parse the workers logs.
-        try:
-            with Pool() as p:
-                results = p.map(self._parse_workers, workers)
-        except (ValueError, IndexError, AttributeError) as e:
-            raise ParseError(f'Failed to parse workers\' logs: {e}')
-        sizes, self.received_samples, workers_ips = zip(*results)
-        self.sizes = {
-            k: v for x in sizes for k, v in x.items() if k in self.commits
-        }
+        # Parse all logs on one pool: every file is a separate task, whatever its kind, and
+        # the results come back packed (see _pack).
+        with Pool() as p:
+            tasks = [
+                p.map_async(self._parse_clients, clients),
+                p.map_async(self._parse_primaries, primaries),
+                p.map_async(self._parse_workers, workers),
+            ]
+
+            # Parse the clients logs.
+            try:
+                results = tasks[0].get()
+            except (ValueError, IndexError, AttributeError) as e:
+                raise ParseError(f'Failed to parse clients\' logs: {e}')
+            self.size, self.rate, self.start, misses, sent_samples \
+                = zip(*results)
+            self.sent_samples = tuple(dict(_unpack(x)) for x in sent_samples)
+            self.misses = sum(misses)
+
+            # Parse the primaries logs.
+            try:
+                results = tasks[1].get()
+            except (ValueError, IndexError, AttributeError) as e:
+                raise ParseError(f'Failed to parse nodes\' logs: {e}')
+            proposals, commits, self.configs, primary_ips, leader_commits, non_leader_commits = zip(*results)
+            self.proposals = self._merge_results([_unpack(x) for x in proposals])
+            self.commits = self._merge_results([_unpack(x) for x in commits])
+            self.leader_commits = self._merge_results([_unpack(x) for x in leader_commits])
+            self.non_leader_commits = self._merge_results([_unpack(x) for x in non_leader_commits])
+
+            # Parse the workers logs.
+            try:
+                results = tasks[2].get()
+            except (ValueError, IndexError, AttributeError) as e:
+                raise ParseError(f'Failed to parse workers\' logs: {e}')
+            sizes, received_samples, workers_ips = zip(*results)
+            self.received_samples = tuple(dict(_unpack(x)) for x in received_samples)
+            self.sizes = {
+                k: v for x in sizes for k, v in _unpack(x) if k in self.commits
+            }
 
         # Determine whether the primary and the workers are collocated.
         self.collocate = set(primary_ips) == set(workers_ips)
 
+        # The headline numbers only count commits inside the window, which leaves out the
+        # first `warmup` seconds after the clients start and the last `cooldown` seconds.
+        self.warmup, self.cooldown = warmup, cooldown
+        self.window = None
+        if (warmup or cooldown) and self.commits:
+            start = min(self.start) + warmup
+            end = max(self.commits.values()) - cooldown
+            if start >= end:
+                raise ParseError('Warm-up and cool-down leave nothing to measure')
+            self.window = (start, end)
+
         # Check whether clients missed their target rate.
         if self.misses != 0:
             Print.warn(
@@ -80,131 +191,169 @@ class LogParser:
                     merged[k] = v
         return merged
 
-    def _parse_clients(self, log):
-        if search(r'Error', log) is not None:
-            raise ParseError('Client(s) panicked')
-
-        size = int(search(r'Transactions size: (\d+)', log).group(1))
-        rate = int(search(r'Transactions rate: (\d+)', log).group(1))
-
-        tmp = search(r'\[(.*Z) .* Start ', log).group(1)
-        start = self._to_posix(tmp)
-
-        misses = len(findall(r'rate too high', log))
-
-        tmp = findall(r'\[(.*Z) .* sample transaction (\d+)', log)
-        samples = {int(s): self._to_posix(t) for t, s in tmp}
-
-        return size, rate, start, misses, samples
-
-    def _parse_primaries(self, log):
-        if search(r'(?:panicked|Error)', log) is not None:
-            raise ParseError('Primary(s) panicked')
-
-        tmp = findall(r'\[(.*Z) .* Created B\d+\([^ ]+\) -> ([^ ]+=)', log)
-        tmp = [(d, self._to_posix(t)) for t, d in tmp]
-        proposals = self._merge_results([tmp])
-
-        tmp = findall(r'\[(.*Z) .* Committed B\d+\([^ ]+\) -> ([^ ]+=)', log)
-        tmp = [(d, self._to_posix(t)) for t, d in tmp]
-        commits = self._merge_results([tmp])
-
-        tmp = findall(r'\[(.*Z) .* Committed B\d+\([^ ]+\) -> ([^ ]+=) Leader', log)
-        tmp = [(d, self._to_posix(t)) for t, d in tmp]
-        leader_commits = self._merge_results([tmp])
-
-        tmp = findall(r'\[(.*Z) .* Committed B\d+\([^ ]+\) -> ([^ ]+=) NonLeader', log)
-        tmp = [(d, self._to_posix(t)) for t, d in tmp]
-        non_leader_commits = self._merge_results([tmp])
-
-        configs = {
-            'header_size': int(
-                search(r'Header size .* (\d+)', log).group(1)
-            ),
-            'max_header_delay': int(
-                search(r'Max header delay .* (\d+)', log).group(1)
-            ),
-            'gc_depth': int(
-                search(r'Garbage collection depth .* (\d+)', log).group(1)
-            ),
-            'sync_retry_delay': int(
-                search(r'Sync retry delay .* (\d+)', log).group(1)
-            ),
-            'sync_retry_nodes': int(
-                search(r'Sync retry nodes .* (\d+)', log).group(1)
-            ),
-            'batch_size': int(
-                search(r'Batch size .* (\d+)', log).group(1)
-            ),
-            'max_batch_delay': int(
-                search(r'Max batch delay .* (\d+)', log).group(1)
-            ),
-        }
-
-        ip = search(r'booted on (\d+.\d+.\d+.\d+)', log).group(1)
-        
-        return proposals, commits, configs, ip, leader_commits, non_leader_commits
-
-    def _parse_workers(self, log):
-        if search(r'(?:panic|Error)', log) is not None:
-            raise ParseError('Worker(s) panicked')
-
-        tmp = findall(r'Batch ([^ ]+) contains (\d+) B', log)
-        sizes = {d: int(s) for d, s in tmp}
-
-        tmp = findall(r'Batch ([^ ]+) contains sample tx (\d+)', log)
-        samples = {int(s): d for d, s in tmp}
+    def _parse_clients(self, filename):
+        size = rate = start = None
+        misses = 0
+        samples = {}
+        stamp = time = None
+        for m in _lines(filename, CLIENT_LINE, ('Error',), 'Client(s)'):
+            if m['sample']:
+                if m['time'] != stamp:
+                    stamp, time = m['time'], self._to_posix(m['time'])
+                samples[int(m['sample'])] = time
+            elif m['miss']:
+                misses += 1
+            elif m['start']:
+                if start is None:
+                    start = self._to_posix(m['time'])
+            elif m['size']:
+                if size is None:
+                    size = int(m['size'])
+            elif m['rate']:
+                if rate is None:
+                    rate = int(m['rate'])
+
+        size = _found(size, 'transactions size', filename)
+        rate = _found(rate, 'transactions rate', filename)
+        start = _found(start, 'start time', filename)
+        return size, rate, start, misses, _pack(samples, 'q', 'd')
+
+    def _parse_primaries(self, filename):
+        # Keep the earliest timestamp of every digest.
+        proposals, commits, leader_commits, non_leader_commits = {}, {}, {}, {}
+        configs = {}
+        ip = None
+        stamp = time = None
+        for m in _lines(filename, PRIMARY_LINE, ('panicked', 'Error'), 'Primary(s)'):
+            if m['event']:
+                # A commit burst logs many lines within the same millisecond: decode each
+                # timestamp once per run of equal ones.
+                if m['time'] != stamp:
+                    stamp, time = m['time'], self._to_posix(m['time'])
+                digest = m['digest']
+                if m['event'] == 'Created':
+                    targets = (proposals,)
+                elif m['leader'] == 'Leader':
+                    targets = (commits, leader_commits)
+                elif m['leader'] == 'NonLeader':
+                    targets = (commits, non_leader_commits)
+                else:
+                    targets = (commits,)
+                for target in targets:
+                    if digest not in target or target[digest] > time:
+                        target[digest] = time
+            elif m['config']:
+                configs.setdefault(PRIMARY_CONFIGS[m['config']], int(m['value']))
+            elif m['ip'] and ip is None:
+                ip = m['ip']
+
+        for name in PRIMARY_CONFIGS.values():
+            _found(configs.get(name), name, filename)
+        ip = _found(ip, 'boot address', filename)
+        return (
+            _pack(proposals, None, 'd'), _pack(commits, None, 'd'), configs, ip,
+            _pack(leader_commits, None, 'd'), _pack(non_leader_commits, None, 'd'),
+        )
 
-        ip = search(r'booted on (\d+.\d+.\d+.\d+)', log).group(1)
+    def _parse_workers(self, filename):
+        sizes, samples = {}, {}
+        ip = None
+        for m in _lines(filename, WORKER_LINE, ('panic', 'Error'), 'Worker(s)'):
+            if m['size']:
+                sizes[m['digest']] = int(m['size'])
+            elif m['sample']:
+                samples[int(m['sample'])] = m['digest']
+            elif m['ip'] and ip is None:
+                ip = m['ip']
 
-        return sizes, samples, ip
+        ip = _found(ip, 'boot address', filename)
+        return _pack(sizes, None, 'q'), _pack(samples, 'q', None), ip
 
     def _to_posix(self, string):
+        # Hot loops call this only when the timestamp differs from the previous line's.
         x = datetime.fromisoformat(string.replace('Z', '+00:00'))
         return datetime.timestamp(x)
 
-    def _consensus_throughput(self):
-        if not self.commits:
+    def _trimmed(self, commits):
+        if self.window is None:
+            return commits
+        start, end = self.window
+        return {d: c for d, c in commits.items() if start <= c <= end}
+
+    def _throughput(self, start):
+        commits = self._trimmed(self.commits)
+        if not commits:
             return 0, 0, 0
-        start, end = min(self.proposals.values()), max(self.commits.values())
+        start, end = self.window or (start, max(commits.values()))
         duration = end - start
-        bytes = sum(self.sizes.values())
+        bytes = sum(self.sizes.get(d, 0) for d in commits)
         bps = bytes / duration
         tps = bps / self.size[0]
         return tps, bps, duration
 
-    def _consensus_latency(self):
-        latency = [c - self.proposals[d] for d, c in self.commits.items()]
-        return mean(latency) if latency else 0
-    
-    def _consensus_leader_latency(self):
-        latency = [c - self.proposals[d] for d, c in self.leader_commits.items()]
-        return mean(latency) if latency else 0
-    
-    def _consensus_non_leader_latency(self):
-        latency = [c - self.proposals[d] for d, c in self.non_leader_commits.items()]
-        return mean(latency) if latency else 0
+    def _consensus_throughput(self):
+        return self._throughput(min(self.proposals.values(), default=0))
+
+    def _consensus_latencies(self, commits):
+        return array('d', (c - self.proposals[d] for d, c in self._trimmed(commits).items()))
 
     def _end_to_end_throughput(self):
-        if not self.commits:
-            return 0, 0, 0
-        start, end = min(self.start), max(self.commits.values())
-        duration = end - start
-        bytes = sum(self.sizes.values())
-        bps = bytes / duration
-        tps = bps / self.size[0]
-        return tps, bps, duration
+        return self._throughput(min(self.start))
 
-    def _end_to_end_latency(self):
-        latency = []
+    def _end_to_end_latencies(self):
+        commits = self._trimmed(self.commits)
+        latency = array('d')
         for sent, received in zip(self.sent_samples, self.received_samples):
             for tx_id, batch_id in received.items():
-                if batch_id in self.commits:
+                if batch_id in commits:
                     assert tx_id in sent  # We receive txs that we sent.
                     start = sent[tx_id]
-                    end = self.commits[batch_id]
-                    latency += [end-start]
-        return mean(latency) if latency else 0
+                    end = commits[batch_id]
+                    latency.append(end-start)
+        return latency
+
+    def series(self, interval=1):
+        """ The whole run (untrimmed) in buckets of `interval` seconds from the clients' start:
+        proposals, commits, committed B/s and tx/s, and the mean consensus and end-to-end
+        latency (ms) of the commits in each bucket. """
+        assert interval > 0
+        origin = min(min(self.start), min(self.proposals.values(), default=inf))
+        end = max(max(self.commits.values(), default=origin), max(self.proposals.values(), default=origin))
+        buckets = int((end - origin) // interval) + 1
+
+        def bucket(time):
+            return int((time - origin) // interval)
+
+        proposals, commits, bytes, samples = (array('q', [0] * buckets) for _ in range(4))
+        consensus, end_to_end = (array('d', [0] * buckets) for _ in range(2))
+        for time in self.proposals.values():
+            proposals[bucket(time)] += 1
+        for digest, time in self.commits.items():
+            i = bucket(time)
+            commits[i] += 1
+            bytes[i] += self.sizes.get(digest, 0)
+            consensus[i] += time - self.proposals[digest]
+        for sent, received in zip(self.sent_samples, self.received_samples):
+            for tx_id, batch_id in received.items():
+                if batch_id in self.commits:
+                    time = self.commits[batch_id]
+                    i = bucket(time)
+                    samples[i] += 1
+                    end_to_end[i] += time - sent[tx_id]
+
+        rows = []
+        for i in range(buckets):
+            bps = bytes[i] / interval
+            rows.append([
+                round(i * interval, 3),
+                proposals[i],
+                commits[i],
+                round(bps),
+                round(bps / self.size[0]),
+                round(consensus[i] / commits[i] * 1_000) if commits[i] else '',
+                round(end_to_end[i] / samples[i] * 1_000) if samples[i] else '',
+            ])
+        return rows
 
     def result(self):
         header_size = self.configs[0]['header_size']
@@ -215,15 +364,31 @@ class LogParser:
         batch_size = self.configs[0]['batch_size']
         max_batch_delay = self.configs[0]['max_batch_delay']
 
-        consensus_latency = self._consensus_latency() * 1_000
-        leader_consensus_latency = self._consensus_leader_latency() * 1_000
-        non_leader_consensus_latency = self._consensus_non_leader_latency() * 1_000
+        consensus = self._consensus_latencies(self.commits)
+        leader_consensus = self._consensus_latencies(self.leader_commits)
+        non_leader_consensus = self._consensus_latencies(self.non_leader_commits)
+        end_to_end = self._end_to_end_latencies()
+
+        consensus_latency = _mean(consensus) * 1_000
+        leader_consensus_latency = _mean(leader_consensus) * 1_000
+        non_leader_consensus_latency = _mean(non_leader_consensus) * 1_000
         consensus_tps, consensus_bps, _ = self._consensus_throughput()
         end_to_end_tps, end_to_end_bps, duration = self._end_to_end_throughput()
-        end_to_end_latency = self._end_to_end_latency() * 1_000
+        end_to_end_latency = _mean(end_to_end) * 1_000
+
+        percentiles = {
+            'Consensus R': latency_percentiles(leader_consensus),
+            'Consensus R-1': latency_percentiles(non_leader_consensus),
+            'Consensus': latency_percentiles(consensus),
+            'E2E': latency_percentiles(end_to_end),
+        }
+
+        trimmed = ''
+        if self.window is not None:
+            trimmed = f' Warm-up / cool-down: {self.warmup:,} s / {self.cooldown:,} s\n'
 
         csv_file_path = f'benchmark_{self.committee_size}_{header_size}_{batch_size}.csv'
-        write_to_csv(round(leader_consensus_latency),round(non_leader_consensus_latency),round(consensus_tps), round(consensus_bps), round(consensus_latency),round(end_to_end_tps),round(end_to_end_bps), round(end_to_end_latency),self.burst,csv_file_path)
+        write_to_csv(round(leader_consensus_latency),round(non_leader_consensus_latency),round(consensus_tps), round(consensus_bps), round(consensus_latency),round(end_to_end_tps),round(end_to_end_bps), round(end_to_end_latency),self.burst,csv_file_path,percentiles)
 
         return (
             '\n'
@@ -238,6 +403,7 @@ class LogParser:
             f' Input rate: {sum(self.rate):,} tx/s\n'
             f' Transaction size: {self.size[0]:,} B\n'
             f' Execution time: {round(duration):,} s\n'
+            f'{trimmed}'
             '\n'
             f' Header size: {header_size:,} B\n'
             f' Max header delay: {max_header_delay:,} ms\n'
@@ -251,12 +417,16 @@ class LogParser:
             f' Consensus TPS: {round(consensus_tps):,} tx/s\n'
             f' Consensus BPS: {round(consensus_bps):,} B/s\n'
             f' Consensus latency: {round(consensus_latency):,} ms\n'
+            f' Consensus latency percentiles: {_format(percentiles["Consensus"])}\n'
             f' Consensus leader latency: {round(leader_consensus_latency):,} ms\n'
+            f' Consensus leader latency percentiles: {_format(percentiles["Consensus R"])}\n'
             f' Consensus non leader latency: {round(non_leader_consensus_latency):,} ms\n'
+            f' Consensus non leader latency percentiles: {_format(percentiles["Consensus R-1"])}\n'
             '\n'
             f' End-to-end TPS: {round(end_to_end_tps):,} tx/s\n'
             f' End-to-end BPS: {round(end_to_end_bps):,} B/s\n'
             f' End-to-end latency: {round(end_to_end_latency):,} ms\n'
+            f' End-to-end latency percentiles: {_format(percentiles["E2E"])}\n'
             '-----------------------------------------\n'
         )
 
@@ -265,34 +435,54 @@ class LogParser:
         with open(filename, 'a') as f:
             f.write(self.result())
 
+    def print_series(self, filename, interval=1):
+        assert isinstance(filename, str)
+        with open(filename, 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(SERIES_COLUMNS)
+            writer.writerows(self.series(interval))
+
     @classmethod
-    def process(cls, directory, burst, faults=0):
+    def process(cls, directory, burst, faults=0, warmup=0, cooldown=0):
         assert isinstance(directory, str)
 
-        clients = []
-        for filename in sorted(glob(join(directory, 'client-*.log'))):
-            with open(filename, 'r') as f:
-                clients += [f.read()]
-        primaries = []
-        for filename in sorted(glob(join(directory, 'primary-*.log'))):
-            with open(filename, 'r') as f:
-                primaries += [f.read()]
-        workers = []
-        for filename in sorted(glob(join(directory, 'worker-*.log'))):
-            with open(filename, 'r') as f:
-                workers += [f.read()]
+        # Only the paths are handed to the parsing processes; each one streams its own file.
+        clients = sorted(glob(join(directory, 'client-*.log')))
+        primaries = sorted(glob(join(directory, 'primary-*.log')))
+        workers = sorted(glob(join(directory, 'worker-*.log')))
 
-        return cls(clients, primaries, workers, burst, faults=faults)
+        return cls(clients, primaries, workers, burst, faults=faults, warmup=warmup, cooldown=cooldown)
 
 
-def write_to_csv(con_r0_latency, con_r1_latency, consensus_tps, consensus_bps, consensus_latency, e2e_tps, e2e_bps, e2e_latency, burst, csv_file_path):
+def write_to_csv(con_r0_latency, con_r1_latency, consensus_tps, consensus_bps, consensus_latency, e2e_tps, e2e_bps, e2e_latency, burst, csv_file_path, percentiles=None):
+    percentiles = percentiles or {}
+    column_names = ['Consensus R Latency', 'Consensus R-1 Latency','Consensus Tps', 'Consensus Bps', 'Consensus Latency', 'E2E Tps' , 'E2E Bps', 'E2E Latency', 'Burst']
+    column_names += [f'{name} Latency {p}' for name, values in percentiles.items() for p in values]
+    _rotate_csv(csv_file_path, column_names)
 # Open the CSV file in append mode
     with open(csv_file_path, mode='a', newline='') as csv_file:
         writer = csv.writer(csv_file)
-        column_names = ['Consensus R Latency', 'Consensus R-1 Latency','Consensus Tps', 'Consensus Bps', 'Consensus Latency', 'E2E Tps' , 'E2E Bps', 'E2E Latency', 'Burst']
         # If the file is empty, write the header
         if csv_file.tell() == 0:
             writer.writerow(column_names)
 
         # Write the extracted data to the CSV file
-        writer.writerow([ con_r0_latency, con_r1_latency, consensus_tps, consensus_bps, consensus_latency, e2e_tps, e2e_bps, e2e_latency, burst])
+        writer.writerow([ con_r0_latency, con_r1_latency, consensus_tps, consensus_bps, consensus_latency, e2e_tps, e2e_bps, e2e_latency, burst]
+                        + [v for values in percentiles.values() for v in values.values()])
+
+
+def _rotate_csv(csv_file_path, column_names):
+    # Rows are only appended under the same header: a file with other columns (e.g. written
+    # before the percentiles were added) is moved aside to the first free <name>.<n>.csv.
+    if not exists(csv_file_path) or getsize(csv_file_path) == 0:
+        return
+    with open(csv_file_path, newline='') as csv_file:
+        header = next(csv.reader(csv_file), [])
+    if header == column_names:
+        return
+    root, ext = splitext(csv_file_path)
+    n = 1
+    while exists(f'{root}.{n}{ext}'):
+        n += 1
+    Print.warn(f'{csv_file_path} has other columns; moved it to {root}.{n}{ext}')
+    rename(csv_file_path, f'{root}.{n}{ext}')
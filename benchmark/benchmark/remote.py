@@ -576,7 +576,12 @@ class Bench:
                         faults = bench_parameters.faults
                         await self._download_logs(consensus_only, committee=committee)
                         Print.info('Parsing logs and computing performance...')
-                        logger = LogParser.process(PathMaker.logs_path(), burst)
+                        logger = LogParser.process(
+                            PathMaker.logs_path(),
+                            burst,
+                            warmup=bench_parameters.warmup,
+                            cooldown=bench_parameters.cooldown,
+                        )
                         logger.print(PathMaker.result_file(
                             faults,
                             n,
@@ -585,6 +590,16 @@ class Bench:
                             rate,
                             bench_parameters.tx_size,
                         ))
+                        logger.print_series(PathMaker.series_file(
+                            faults,
+                            n,
+                            bench_parameters.workers,
+                            bench_parameters.collocate,
+                            rate,
+                            bench_parameters.tx_size,
+                            burst,
+                            i,
+                        ), bench_parameters.series_interval)
                 
                     except (subprocess.SubprocessError, ParseError) as e:
                         self._kill(hosts_to_connections=self.hosts_to_connections)
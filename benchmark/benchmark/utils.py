@@ -71,6 +71,13 @@ class PathMaker:
             f'bench-{faults}-{nodes}-{workers}-{collocate}-{rate}-{tx_size}.txt'
         )
 
+    @staticmethod
+    def series_file(faults, nodes, workers, collocate, rate, tx_size, burst, run):
+        return join(
+            PathMaker.results_path(),
+            f'series-{faults}-{nodes}-{workers}-{collocate}-{rate}-{tx_size}-{burst}-{run}.csv'
+        )
+
     @staticmethod
     def plots_path():
         return 'plots'
@@ -5,17 +5,44 @@ keyed by a monotonically increasing **batch_index** (as a string). The value for
 batch record (without an embedded batch_index field).
 
 Input file may contain multiple pretty-printed JSON objects back-to-back (not a JSON array), each
-object being a certificate produced by Sailfish.
+object being a certificate produced by Sailfish. With `--follow` the extractor keeps the file open
+and processes certificates as the primary appends them. The byte offset reached in the input is
+kept in `<output>.checkpoint`, so a restarted extractor resumes reading where it stopped.
 
 Behavior:
 - Skips certificates with empty payloads.
 - For each batch digest, tries to take transactions from the certificate's `transactions` map.
-  If missing/invalid, it invokes `sailfish_batch_cli` to fetch them. Retries with backoff until
-  found or until `--max-retries` is exhausted. On exhaustion, snapshots progress and exits(2).
-- Progressive **atomic snapshots** to the output file so you can see results while it runs.
-- Resumable: If the output dict already contains some batches, new entries start from
-  max(existing keys) + 1, and previously processed (cert_id, batch_digest) pairs are skipped.
-- Ctrl+C / SIGTERM safe: it writes a final snapshot before exiting.
+  If missing/invalid, it asks `sailfish_batch_cli` for them. By default a single long-lived
+  `sailfish_batch_cli --serve` process keeps the worker stores open and answers lookups over a
+  pipe; `--no-serve` falls back to concurrent CLI processes, one per digest. Up to `--window`
+  certificates are read ahead, and every missing batch among them whose retry is due is
+  requested in one call. Each missing batch is retried on its own exponential backoff with
+  jitter until found or until `--max-retries` is exhausted, while records are still emitted
+  strictly in consensus order through a reorder buffer. On exhaustion, snapshots progress and
+  exits(2). Each lookup goes only to the store of the worker id recorded in the certificate's
+  payload.
+- Each new record is appended to `<output>.journal` (JSON lines, fsynced), so its I/O cost does
+  not depend on how many records came before. The journal is periodically compacted into an
+  **atomic snapshot** of the output dict; `load_existing_output` returns snapshot + journal.
+  The drivers record executed blocks in the same journal; appends and compactions lock it.
+- Resumable: whenever whole certificates have been emitted, `<output>.checkpoint` records the input byte offset,
+  the last cert id, next_index and the journal/snapshot positions. A restart with a matching
+  checkpoint reads only the journal written after it, so its cost does not grow with the chain.
+  Without one (or if the output was rewritten since), new entries start from max(existing
+  keys) + 1 of the whole output, and previously processed (cert_id, batch_digest) pairs are
+  skipped.
+- Ctrl+C / SIGTERM safe: it compacts the journal into a final snapshot before exiting.
+- An `--output` ending in `.batches` is written in the binary batch format of `batchfile.py`
+  instead (raw transaction bytes, an mmapped index, append-only), which the state-transition
+  drivers read without loading the whole file. It needs no journal or compaction.
+- Several nodes in one process: `--nodes 0,1,2,3` extracts every node listed, substituting the
+  id for `{node}` in --input/--output/--checkpoint/--db. The nodes share one lookup server (or
+  CLI pool) and an in-memory batch cache, so a batch ordered by all nodes is fetched and decoded
+  once; each node still has its own output, journal and checkpoint.
+- Fetched batches are also written to a content-addressed cache directory (`--batch-cache`,
+  default `.batch_cache` next to the output) as raw transaction bytes, bounded by
+  `--batch-cache-mb` with least-recently-used eviction. Digests are looked up there before the
+  worker stores, so reruns, restarts and other nodes mostly read batches from disk.
 
 Output format example (object):
 {
@@ -36,25 +63,53 @@ Run:
       --input ordered_cert.json \
       --output Output/transactions_batch.json \
       --sailfish-cli ./target/release/sailfish_batch_cli \
-      --db /path/to/worker-0 --db /path/to/worker-1 -vv
+      --db 0=/path/to/worker-0 --db 1=/path/to/worker-1 -vv
+
+  python3 extract_batches_from_ordered_certs.py --nodes 0,1,2,3 \
+      --input 'Output/.db-{node}/ordered_certificates.json' \
+      --output 'Output/transactions_batch_node_{node}.batches' \
+      --sailfish-cli ./target/release/sailfish_batch_cli \
+      --db '0=Output/.db-{node}-0/' --db '1=Output/.db-{node}-1' --follow -vv
 """
 
 import argparse
+import codecs
+import fcntl
+import hashlib
 import json
 import logging
 import os
+import random
+import re
+import select
 import signal
 import subprocess
 import sys
 import time
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import Dict, Iterable, List, Optional, Union
+from typing import Deque, Dict, Iterator, List, Optional, Tuple, Union
+
+from batchfile import BatchFile, append_journal_line, is_batch_file
 
-# How often to snapshot (atomic write). Set to 1 to snapshot every new record.
-SNAPSHOT_EVERY = 1
+# New records are appended to `<output>.journal` (one JSON line each, fsynced). The journal is
+# compacted into the JSON object at `<output>` once it outgrows COMPACT_RATIO x the snapshot size
+# (and at least COMPACT_MIN_BYTES), which keeps the amortized I/O per record O(record size).
+COMPACT_RATIO = 1.0
+COMPACT_MIN_BYTES = 4 * 1024 * 1024
+
+# Fetched batches are kept in a content-addressed directory shared by all runs and nodes, evicted
+# least recently used first once it grows past --batch-cache-mb (down to CACHE_EVICT_TO x that).
+CACHE_EVICT_TO = 0.9
 
 STOP_REQUESTED = False
 
+# A worker store is addressed by (node, worker id)
+Route = Tuple[str, int]
+
+_WHITESPACE = re.compile(r"\s*")
+
 def _signal_handler(signum, _frame):
     global STOP_REQUESTED
     STOP_REQUESTED = True
@@ -62,22 +117,76 @@ def _signal_handler(signum, _frame):
 
 # -------------------- Helpers --------------------
 
-def iter_json_objects(path: Path) -> Iterable[dict]:
-    """Parse a file that contains multiple pretty-printed JSON objects back-to-back."""
-    buf = ""
-    with path.open("r", encoding="utf-8") as f:
-        for line in f:
-            if not buf and not line.strip():
-                continue
-            buf += line
-            try:
-                obj = json.loads(buf)
-                yield obj
-                buf = ""
-            except json.JSONDecodeError:
-                continue
-    if buf.strip():
-        raise ValueError(f"Incomplete JSON object at end of file: {path}")
+class CertificateStream:
+    """Decode back-to-back JSON objects (pretty-printed or not) from `path`, starting at byte `offset`.
+
+    Chunks are decoded once with `JSONDecoder.raw_decode`; an object cut off at the end of the data
+    read so far is retried only after more data arrives. With `follow`, EOF does not end the stream:
+    `None` is yielded each time the reader has caught up, and the next step reads whatever was
+    appended since (like `tail -f`; the caller decides how long to wait in between). `offset` is
+    always the byte position just past the last yielded object.
+    """
+
+    CHUNK_SIZE = 1 << 20
+
+    def __init__(self, path: Path, offset: int = 0, follow: bool = False):
+        self.path = path
+        self.offset = offset
+        self.follow = follow
+
+    def __iter__(self) -> Iterator[Optional[dict]]:
+        decoder = json.JSONDecoder()
+        utf8 = codecs.getincrementaldecoder("utf-8")()
+        buf, pos = "", 0
+        with self.path.open("rb") as f:
+            f.seek(self.offset)
+            while True:
+                chunk = f.read(self.CHUNK_SIZE)
+                if chunk:
+                    buf = buf[pos:] + utf8.decode(chunk)
+                    pos = 0
+                    while True:
+                        start = _WHITESPACE.match(buf, pos).end()
+                        if start == len(buf):
+                            break
+                        try:
+                            obj, end = decoder.raw_decode(buf, start)
+                        except json.JSONDecodeError:
+                            break  # incomplete object; wait for more data
+                        self.offset += len(buf[pos:end].encode("utf-8"))
+                        pos = end
+                        yield obj
+                    continue
+
+                if not self.follow:
+                    if buf[pos:].strip():
+                        raise ValueError(f"Incomplete JSON object at end of file: {self.path}")
+                    return
+                if STOP_REQUESTED:
+                    return
+                yield None
+
+
+def load_checkpoint(path: Path) -> dict:
+    if not path.exists():
+        return {}
+    try:
+        with path.open("r", encoding="utf-8") as f:
+            data = json.load(f)
+        return data if isinstance(data, dict) else {}
+    except Exception as e:
+        logging.warning("Failed to read checkpoint at %s: %s", path, e)
+        return {}
+
+
+def save_checkpoint(path: Path, checkpoint: dict) -> None:
+    """Atomically replace the checkpoint. No fsync: losing it only means re-reading from an
+    older offset, and already-processed batches are skipped."""
+    tmp = path.with_suffix(path.suffix + ".tmp")
+    with tmp.open("w", encoding="utf-8") as f:
+        json.dump(checkpoint, f)
+    tmp.replace(path)
+
 
 def normalize_tx_hex(tx: str) -> str:
     tx = tx.strip()
@@ -131,6 +240,308 @@ def run_sailfish_cli(
     return None
 
 
+class SailfishBatchServer:
+    """Pipe client for a long-lived `sailfish_batch_cli --serve` process.
+
+    The server keeps the worker stores open and answers one JSON line per requested digest, in
+    request order. A request line may carry many digests, which the server resolves together.
+    `stores` maps a route, (node, worker id), to a store; digests with a known route are looked
+    up in that store only.
+    """
+
+    def __init__(self, cli_path: Path, stores: Dict[Route, Path], timeout_sec: float = 60):
+        self.cli_path = cli_path
+        self.routes = {route: i for i, route in enumerate(sorted(stores))}
+        self.db_paths = [stores[r] for r in sorted(stores)]
+        # Longest wait for each response line, as for one CLI call without the server
+        self.timeout_sec = timeout_sec
+        self.proc: Optional[subprocess.Popen] = None
+        self._buffer = b""
+
+    def _ensure_started(self) -> subprocess.Popen:
+        if self.proc is None or self.proc.poll() is not None:
+            cmd = [str(self.cli_path), "--serve"] + [str(p) for p in self.db_paths]
+            logging.info("Starting batch lookup server: %s", " ".join(cmd))
+            self.proc = subprocess.Popen(cmd, stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+            self._buffer = b""
+        return self.proc
+
+    def _readline(self, proc: subprocess.Popen) -> bytes:
+        """The next response line; raises TimeoutError if it takes longer than timeout_sec."""
+        deadline = time.monotonic() + self.timeout_sec
+        fd = proc.stdout.fileno()
+        while b"\n" not in self._buffer:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise TimeoutError(f"no response from the batch lookup server in {self.timeout_sec}s")
+            if not select.select([fd], [], [], remaining)[0]:
+                continue
+            chunk = os.read(fd, 1 << 16)
+            if not chunk:
+                raise BrokenPipeError("batch lookup server closed its output")
+            self._buffer += chunk
+        line, _, self._buffer = self._buffer.partition(b"\n")
+        return line
+
+    def _query(self, digest: str, route: Optional[Route]) -> str:
+        if route in self.routes:
+            return f"{self.routes[route]}:{digest}"
+        return digest
+
+    def lookup_many(self, digests: Dict[str, Optional[Route]]) -> Dict[str, Optional[List[str]]]:
+        """Resolve all `digests` (digest -> route) in one request; misses map to None."""
+        results: Dict[str, Optional[List[str]]] = {d: None for d in digests}
+        if not digests:
+            return results
+        queries = {d: self._query(d, w) for d, w in digests.items()}
+        proc = self._ensure_started()
+        try:
+            proc.stdin.write((" ".join(queries.values()) + "\n").encode())
+            proc.stdin.flush()
+            for digest, query in queries.items():
+                data = json.loads(self._readline(proc))
+                if data.get("query") != query:
+                    raise ValueError(f"out-of-order response {data.get('query')!r} for {query!r}")
+                txs = data.get("txns")
+                if isinstance(txs, list) and all(isinstance(x, str) for x in txs):
+                    results[digest] = txs
+        except (OSError, ValueError) as e:
+            logging.warning("Batch lookup server failed (%s); restarting on next lookup.", e)
+            if isinstance(e, TimeoutError):
+                proc.kill()  # hung: do not wait for it to exit
+            self.close()
+        return results
+
+    def lookup(self, digest: str, route: Optional[Route] = None) -> Optional[List[str]]:
+        return self.lookup_many({digest: route})[digest]
+
+    def close(self) -> None:
+        if self.proc is None:
+            return
+        try:
+            self.proc.stdin.close()
+            self.proc.wait(timeout=5)
+        except (OSError, subprocess.TimeoutExpired):
+            self.proc.kill()
+        self.proc = None
+
+
+def fetch_batches(
+    server: Optional[SailfishBatchServer],
+    pool: ThreadPoolExecutor,
+    cli_path: Path,
+    stores: Dict[Route, Path],
+    digests: Dict[str, Optional[Route]],
+) -> Dict[str, Optional[List[str]]]:
+    """Resolve `digests` (digest -> route) through the lookup server, or with concurrent CLI
+    calls on `pool` without one. A digest with a known route is only looked up in that store."""
+    if server is not None:
+        return server.lookup_many(digests)
+    all_paths = [stores[w] for w in sorted(stores)]
+    results = pool.map(
+        lambda item: run_sailfish_cli(cli_path, item[0], [stores[item[1]]] if item[1] in stores else all_paths),
+        digests.items(),
+    )
+    return dict(zip(digests, results))
+
+
+class RetryScheduler:
+    """Reorder buffer for batches awaiting their transactions, kept in consensus order.
+
+    Every missing digest is retried on its own exponential backoff with jitter, so later batches
+    keep resolving while an earlier one is still missing. `pop_ready` releases entries strictly
+    in order: a resolved entry is held until every entry before it is resolved.
+
+    Entries are [cert, batch_digest, route, txs, end_offset]. The last entry of a certificate
+    carries the input offset just past it; a certificate with nothing to extract gets a single
+    placeholder entry whose batch_digest is None.
+    """
+
+    def __init__(self, base_delay: float, max_delay: float, max_retries: int):
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.max_retries = max_retries
+        self.entries: Deque[list] = deque()
+        self.waiting: Dict[str, dict] = {}
+        self.certs = 0
+        self.exhausted: Optional[str] = None
+
+    def add_cert(self, cert: dict, batches: List[tuple], end_offset: int) -> None:
+        """Queue `batches` [(batch_digest, route, txs-or-None)] of `cert` in order."""
+        if not batches:
+            batches = [(None, None, [])]
+        for i, (digest, route, txs) in enumerate(batches):
+            entry = [cert, digest, route, txs, end_offset if i == len(batches) - 1 else None]
+            self.entries.append(entry)
+            if txs is None:
+                state = self.waiting.setdefault(
+                    digest, {"route": route, "attempts": 0, "due": 0.0, "entries": []}
+                )
+                state["entries"].append(entry)
+        self.certs += 1
+
+    def due(self, now: float) -> Dict[str, Optional[Route]]:
+        """Digests (-> route) whose next lookup is due."""
+        return {d: st["route"] for d, st in self.waiting.items() if st["due"] <= now}
+
+    def next_due(self) -> Optional[float]:
+        return min((st["due"] for st in self.waiting.values()), default=None)
+
+    def resolve(self, found: Dict[str, Optional[List[str]]], now: float) -> None:
+        """Record the outcome of one lookup round; misses are rescheduled with backoff."""
+        for digest, txs in found.items():
+            state = self.waiting.get(digest)
+            if state is None:
+                continue
+            state["attempts"] += 1
+            if txs:
+                for entry in state["entries"]:
+                    entry[3] = txs
+                del self.waiting[digest]
+                logging.info("Fetched %d txs for %s (attempt %d)", len(txs), digest, state["attempts"])
+            elif self.max_retries != -1 and state["attempts"] >= self.max_retries:
+                logging.error("Exhausted retries for %s after %d attempts.", digest, state["attempts"])
+                self.exhausted = self.exhausted or digest
+            else:
+                delay = min(self.max_delay, self.base_delay * 2 ** (state["attempts"] - 1))
+                state["due"] = now + random.uniform(delay / 2, delay)
+                logging.debug("Missing txs for %s (attempt %d). Retrying in ~%.2fs ...",
+                              digest, state["attempts"], delay)
+
+    def pop_ready(self) -> Iterator[list]:
+        while self.entries and self.entries[0][3] is not None:
+            entry = self.entries.popleft()
+            if entry[4] is not None:
+                self.certs -= 1
+            yield entry
+
+
+class DiskBatchCache:
+    """Content-addressed on-disk batch cache: one file per batch digest, under a two-hex-digit
+    fan-out directory. A file holds the raw transaction bytes, each prefixed with its 4-byte
+    big-endian length. Hits refresh the file's mtime; once the directory exceeds `max_bytes`,
+    the files with the oldest mtime are removed first."""
+
+    def __init__(self, directory: Path, max_bytes: int):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.total_bytes = sum(f.stat().st_size for f in self._files())
+
+    def _files(self) -> Iterator[Path]:
+        return (f for f in self.directory.glob("??/*") if not f.name.endswith(".tmp"))
+
+    def _path(self, digest: str) -> Path:
+        name = hashlib.sha256(digest.encode("utf-8")).hexdigest()
+        return self.directory / name[:2] / name
+
+    def get(self, digest: str) -> Optional[List[str]]:
+        path = self._path(digest)
+        try:
+            data = path.read_bytes()
+            os.utime(path)
+        except OSError:
+            return None
+        txs, pos = [], 0
+        while pos + 4 <= len(data):
+            size = int.from_bytes(data[pos:pos + 4], "big")
+            txs.append("0x" + data[pos + 4:pos + 4 + size].hex())
+            pos += 4 + size
+        if pos != len(data):
+            logging.warning("Discarding corrupt cache entry %s for %s", path, digest)
+            path.unlink(missing_ok=True)
+            return None
+        return txs
+
+    def put(self, digest: str, txs: List[str]) -> None:
+        """Store `txs` (normalized hex). Batches that do not round-trip through bytes, e.g. with
+        odd-length or upper-case hex, are not cached."""
+        try:
+            raws = [bytes.fromhex(t[2:]) for t in txs]
+        except ValueError:
+            return
+        if ["0x" + r.hex() for r in raws] != txs:
+            return
+        data = b"".join(len(r).to_bytes(4, "big") + r for r in raws)
+        path = self._path(digest)
+        path.parent.mkdir(exist_ok=True)
+        tmp = path.with_name(path.name + ".tmp")
+        try:
+            old = path.stat().st_size if path.exists() else 0
+            tmp.write_bytes(data)
+            tmp.replace(path)
+        except OSError as e:
+            logging.warning("Failed to cache batch %s: %s", digest, e)
+            return
+        self.total_bytes += len(data) - old
+        if self.total_bytes > self.max_bytes:
+            self.evict()
+
+    def evict(self) -> None:
+        files = []
+        for f in self._files():
+            try:
+                st = f.stat()
+            except OSError:
+                continue
+            files.append((st.st_mtime, st.st_size, f))
+        files.sort()
+        self.total_bytes = sum(size for _, size, _ in files)
+        target = self.max_bytes * CACHE_EVICT_TO
+        removed = 0
+        for _, size, f in files:
+            if self.total_bytes <= target:
+                break
+            f.unlink(missing_ok=True)
+            self.total_bytes -= size
+            removed += 1
+        logging.info("Evicted %d cached batches from %s", removed, self.directory)
+
+
+class BatchCache:
+    """Digest -> normalized transactions, shared by all nodes of one run. A batch appears in every
+    node's ordered output, so it is fetched once; least recently used entries are evicted. With
+    `disk`, memory misses fall back to the on-disk cache kept across runs."""
+
+    def __init__(self, capacity: int, disk: Optional[DiskBatchCache] = None):
+        self.capacity = capacity
+        self.disk = disk
+        self.entries: "OrderedDict[str, List[str]]" = OrderedDict()
+
+    def get(self, digest: str) -> Optional[List[str]]:
+        txs = self.entries.get(digest)
+        if txs is not None:
+            self.entries.move_to_end(digest)
+        elif self.disk is not None:
+            txs = self.disk.get(digest)
+            if txs is not None:
+                self._remember(digest, txs)
+        return txs
+
+    def put(self, digest: str, txs: List[str]) -> None:
+        self._remember(digest, txs)
+        if self.disk is not None:
+            self.disk.put(digest, txs)
+
+    def _remember(self, digest: str, txs: List[str]) -> None:
+        self.entries[digest] = txs
+        self.entries.move_to_end(digest)
+        while len(self.entries) > self.capacity:
+            self.entries.popitem(last=False)
+
+
+def parse_worker_stores(values: List[str]) -> Dict[int, Path]:
+    """Map worker id -> store from `--db [ID=]PATH` values; a bare PATH takes its position as id."""
+    stores: Dict[int, Path] = {}
+    for pos, value in enumerate(values):
+        worker_id, sep, path = value.partition("=")
+        if sep and worker_id.isdigit():
+            stores[int(worker_id)] = Path(path)
+        else:
+            stores[pos] = Path(value)
+    return stores
+
+
 def extract_transactions_from_cert_transactions_field(
     cert_transactions: Dict[str, Union[str, List[str]]],
     batch_digest: str,
@@ -150,8 +561,47 @@ def extract_transactions_from_cert_transactions_field(
     return None
 
 
-def load_existing_output(path: Path) -> Dict[str, dict]:
-    """Load an existing output file expected to be a JSON object (dict)."""
+def build_record(cert: dict, batch_digest: str, txs: List[str]) -> dict:
+    """Output record for one batch of `cert` (the batch_index is the key, not a field).
+    `txs` are already normalized."""
+    return {
+        "cert_id": cert.get("id"),
+        "round": cert.get("round"),
+        "author": cert.get("author"),
+        "batch_digest": batch_digest,
+        "transactions": txs,
+        "blockhash": None,
+        "blocknumber": -1,
+    }
+
+
+def journal_path(path: Path) -> Path:
+    return path.with_suffix(path.suffix + ".journal")
+
+
+def replay_journal(path: Path, records: Dict[str, dict], start: int = 0) -> int:
+    """Apply the journal of output `path`, read from byte `start`, onto `records`; return the
+    offset it was read to. A torn line (crash mid-append) is skipped: the next append ends it,
+    and lines other writers appended after it are still applied.
+    """
+    jpath = journal_path(path)
+    if not jpath.exists():
+        return 0
+    end = start
+    with jpath.open("rb") as f:
+        f.seek(start)
+        for line in f:
+            try:
+                entry = json.loads(line)
+                records[entry["key"]] = entry["record"]
+            except (ValueError, KeyError, TypeError):
+                logging.warning("Ignoring torn journal line at byte %d of %s", end, jpath)
+            end += len(line)
+    return end
+
+
+def load_snapshot(path: Path) -> Dict[str, dict]:
+    """Load an existing output snapshot expected to be a JSON object (dict)."""
     if not path.exists():
         return {}
     try:
@@ -166,6 +616,19 @@ def load_existing_output(path: Path) -> Dict[str, dict]:
         return {}
 
 
+def load_existing_output(path: Path) -> Dict[str, dict]:
+    """Load an existing output: the JSON object snapshot plus its append-only journal, or every
+    record of a binary batch file."""
+    if is_batch_file(path):
+        if not path.exists():
+            return {}
+        with BatchFile(path) as f:
+            return {str(i): f.record(i) for i in f.indices()}
+    records = load_snapshot(path)
+    replay_journal(path, records)
+    return records
+
+
 def snapshot_atomic(path: Path, records: Dict[str, dict]) -> None:
     """Atomically write JSON object to path and fsync."""
     path.parent.mkdir(parents=True, exist_ok=True)
@@ -177,6 +640,257 @@ def snapshot_atomic(path: Path, records: Dict[str, dict]) -> None:
     tmp.replace(path)
     logging.debug("Snapshot written: %s (count=%d)", path, len(records))
 
+
+class BatchOutput:
+    """Output dict at `path`, grown by appending to its journal and compacted periodically.
+
+    Only the journal from byte `start` (a checkpointed journal offset) is read when opening;
+    those records are kept in `recent`. The full dict is only loaded while compacting.
+    """
+
+    def __init__(self, path: Path, start: int = 0):
+        self.path = path
+        self.snapshot_bytes = path.stat().st_size if path.exists() else 0
+        self.recent: Dict[str, dict] = {}
+        self.journal_bytes = replay_journal(path, self.recent, start)
+        jpath = journal_path(path)
+        jpath.parent.mkdir(parents=True, exist_ok=True)
+        self.journal = jpath.open("a+b")
+
+    def append(self, key: str, record: dict) -> None:
+        # The drivers append to the same journal (batchfile.JsonJournal), under the same lock
+        line = json.dumps({"key": key, "record": record}, separators=(",", ":")).encode() + b"\n"
+        self.journal_bytes = append_journal_line(self.journal, line)
+
+    def maybe_compact(self) -> None:
+        if self.journal_bytes >= max(COMPACT_MIN_BYTES, COMPACT_RATIO * self.snapshot_bytes):
+            self.compact()
+
+    def compact(self) -> int:
+        """Fold the journal into a fresh snapshot and return the record count. Replaying a
+        journal that is already part of the snapshot is harmless, so a crash between the two
+        steps loses nothing. The journal stays locked throughout, so no other writer's line
+        lands between reading it and emptying it."""
+        fcntl.flock(self.journal.fileno(), fcntl.LOCK_EX)
+        try:
+            records = load_existing_output(self.path)
+            snapshot_atomic(self.path, records)
+            self.snapshot_bytes = self.path.stat().st_size
+            self.journal.truncate(0)
+            self.journal.flush()
+            os.fsync(self.journal.fileno())
+        finally:
+            fcntl.flock(self.journal.fileno(), fcntl.LOCK_UN)
+        self.journal_bytes = 0
+        return len(records)
+
+    def close(self) -> int:
+        count = self.compact()
+        self.journal.close()
+        return count
+
+
+class BinaryBatchOutput:
+    """`BatchOutput` for a binary batch file (`*.batches`). The file is append-only already, so
+    there is no journal or compaction; `journal_bytes` counts batches instead of bytes and
+    `recent` holds the batches from index `start` on."""
+
+    snapshot_bytes = 0
+
+    def __init__(self, path: Path, start: int = 0):
+        self.path = path
+        self.file = BatchFile(path, writable=True, repair=True)
+        self.recent: Dict[str, dict] = {str(i): self.file.record(i) for i in range(start, len(self.file))}
+        self.journal_bytes = len(self.file)
+
+    def append(self, key: str, record: dict) -> None:
+        if int(key) != len(self.file):
+            raise ValueError(f"batch {key} does not follow the {len(self.file)} batches in {self.path}")
+        self.file.append(record)
+        self.journal_bytes = len(self.file)
+
+    def maybe_compact(self) -> None:
+        pass
+
+    def close(self) -> int:
+        count = len(self.file)
+        self.file.close()
+        return count
+
+
+def open_output(path: Path, start: int = 0) -> Union[BatchOutput, BinaryBatchOutput]:
+    return BinaryBatchOutput(path, start) if is_batch_file(path) else BatchOutput(path, start)
+
+
+def checkpoint_matches(output: Path, checkpoint: dict) -> bool:
+    """True if `checkpoint` still describes the output on disk: the snapshot was not rewritten
+    since (by a compaction or another tool) and the journal still reaches the saved offset.
+    A binary batch file only has to hold at least the checkpointed number of batches."""
+    if not all(k in checkpoint for k in ("input_offset", "next_index", "journal_offset", "snapshot_bytes")):
+        return False
+    if is_batch_file(output):
+        if not output.exists():
+            return False
+        with BatchFile(output) as f:
+            return checkpoint["snapshot_bytes"] == 0 and len(f) >= checkpoint["journal_offset"]
+    snapshot_bytes = output.stat().st_size if output.exists() else 0
+    jpath = journal_path(output)
+    journal_bytes = jpath.stat().st_size if jpath.exists() else 0
+    return snapshot_bytes == checkpoint["snapshot_bytes"] and journal_bytes >= checkpoint["journal_offset"]
+
+
+class NodeExtractor:
+    """Extraction state of one node: its certificate stream, reorder buffer, output and checkpoint."""
+
+    def __init__(
+        self,
+        node: str,
+        input_path: Path,
+        output_path: Path,
+        checkpoint_path: Path,
+        stores: Dict[int, Path],
+        follow: bool,
+        scheduler: RetryScheduler,
+    ):
+        self.node = node
+        self.output_path = output_path
+        self.checkpoint_path = checkpoint_path
+        self.stores = stores
+        self.scheduler = scheduler
+
+        # Resume from the checkpoint when it still matches the output on disk: only the journal
+        # written after it is read. Otherwise rebuild the processed set and next index from the
+        # whole output (snapshot + journal).
+        checkpoint = load_checkpoint(checkpoint_path)
+        if checkpoint_matches(output_path, checkpoint):
+            self.output = open_output(output_path, start=checkpoint["journal_offset"])
+            existing = self.output.recent
+            self.next_index = int(checkpoint["next_index"])
+            logging.info("[node %s] Resuming after cert %s from checkpoint %s",
+                         node, checkpoint.get("last_cert_id"), checkpoint_path)
+        else:
+            # A stale checkpoint's input offset would skip certificates whose batches are no
+            # longer in the output; re-read the input and let the processed set drop duplicates.
+            if checkpoint:
+                logging.warning("[node %s] Checkpoint %s does not match %s; reading %s from the start.",
+                                node, checkpoint_path, output_path, input_path)
+                checkpoint = {}
+            self.output = open_output(output_path)
+            # A binary output was read whole by opening it
+            existing = self.output.recent if is_batch_file(output_path) else load_existing_output(output_path)
+            self.next_index = 0
+            logging.info("[node %s] Loaded %d existing batches from %s", node, len(existing), output_path)
+
+        self.processed = set()
+        for key, rec in existing.items():
+            try:
+                self.next_index = max(self.next_index, int(key) + 1)
+            except ValueError:
+                pass
+            cid = rec.get("cert_id")
+            bd  = rec.get("batch_digest")
+            if cid and bd:
+                self.processed.add((cid, bd))
+        logging.info("[node %s] next_index=%d", node, self.next_index)
+
+        offset = int(checkpoint.get("input_offset", 0))
+        if offset > input_path.stat().st_size:
+            logging.warning("[node %s] Checkpoint offset %d is past the end of %s; reading from the start.",
+                            node, offset, input_path)
+            offset = 0
+        self.stream = CertificateStream(input_path, offset=offset, follow=follow)
+        self.certs = iter(self.stream)
+        logging.info("[node %s] Reading %s from byte %d%s", node, input_path, offset, " (follow)" if follow else "")
+
+        self.input_done = False
+        self.caught_up = False
+        self.cert_counter = 0
+        # Input offset / cert id of the last certificate whose batches are all in the output
+        self.emitted_offset = offset
+        self.last_cert_id = checkpoint.get("last_cert_id")
+        self.at_boundary = True
+
+    @property
+    def finished(self) -> bool:
+        return self.input_done and not self.scheduler.entries
+
+    def can_read(self, window: int) -> bool:
+        return not self.input_done and not self.caught_up and self.scheduler.certs < window
+
+    def read_ahead(self, window: int) -> None:
+        """Queue certificates while the reorder buffer has room."""
+        self.caught_up = False
+        while not self.input_done and self.scheduler.certs < window:
+            cert = next(self.certs, StopIteration)
+            if cert is StopIteration:
+                self.input_done = True
+                break
+            if cert is None:  # caught up with a followed input
+                self.caught_up = True
+                break
+
+            self.cert_counter += 1
+            cert_id = cert.get("id")
+            payload = cert.get("payload", {}) or {}
+            cert_transactions = cert.get("transactions") or {}
+            if not payload:
+                logging.debug("[node %s] Cert #%d has no payload; skipping.", self.node, self.cert_counter)
+
+            batches = []
+            # Deterministic per-cert order
+            for batch_digest, worker_id in sorted(payload.items(), key=lambda kv: kv[0]):
+                # Skip if already processed (supports skipping starting batches already present)
+                if cert_id and (cert_id, batch_digest) in self.processed:
+                    logging.debug("[node %s] Skipping already-processed batch %s from cert %s",
+                                  self.node, batch_digest, cert_id)
+                    continue
+                # Transactions from the certificate itself, if it has them
+                txs = extract_transactions_from_cert_transactions_field(cert_transactions, batch_digest)
+                if txs is not None:
+                    txs = [normalize_tx_hex(t) for t in txs]
+                route = (self.node, worker_id) if worker_id in self.stores else None
+                batches.append((batch_digest, route, txs))
+            self.scheduler.add_cert(cert, batches, self.stream.offset)
+
+    def emit(self) -> None:
+        """Append resolved batches strictly in consensus order and checkpoint whole certificates."""
+        boundary_passed = False
+        for cert, batch_digest, _route, txs, end_offset in self.scheduler.pop_ready():
+            self.at_boundary = False
+            if batch_digest is not None:
+                # Build record **without** embedding batch_index. Use key=str(next_index)
+                self.output.append(str(self.next_index), build_record(cert, batch_digest, txs))
+                self.next_index += 1
+                if cert.get("id"):
+                    self.processed.add((cert.get("id"), batch_digest))
+            if end_offset is not None:
+                self.emitted_offset, self.last_cert_id = end_offset, cert.get("id")
+                self.at_boundary = boundary_passed = True
+        if boundary_passed:
+            # Every emitted batch is durable in the journal; later runs can start here
+            self.output.maybe_compact()
+            save_checkpoint(self.checkpoint_path, self.progress())
+
+    def progress(self) -> dict:
+        return {
+            "input_offset": self.emitted_offset,
+            "last_cert_id": self.last_cert_id,
+            "next_index": self.next_index,
+            "journal_offset": self.output.journal_bytes,
+            "snapshot_bytes": self.output.snapshot_bytes,
+        }
+
+    def close(self) -> None:
+        """Final snapshot; the checkpoint stays valid if the output ends on a certificate boundary."""
+        count = self.output.close()
+        if self.at_boundary:
+            save_checkpoint(self.checkpoint_path, self.progress())
+        logging.info("[node %s] Wrote %d batch records to %s", self.node, count, self.output_path)
+
+
+def node_path(template: str, node: str) -> str:
+    return template.replace("{node}", node)
+
 # -------------------- Main --------------------
 
 def main() -> int:
@@ -185,13 +899,40 @@ def main() -> int:
     signal.signal(signal.SIGTERM, _signal_handler)
 
     ap = argparse.ArgumentParser(description="Extract ordered batches into dict keyed by batch_index (string)")
-    ap.add_argument("--input", required=True, type=Path, help="Path to ordered_cert.json (pretty JSON objects)")
-    ap.add_argument("--output", required=True, type=Path, help="Path to write/append the batches JSON object")
+    ap.add_argument("--input", required=True, help="Path to ordered_cert.json (pretty JSON objects)")
+    ap.add_argument("--output", required=True, help="Path to write/append the batches JSON object")
+    ap.add_argument("--nodes", default=None,
+                    help="Comma-separated node ids to extract in this process, e.g. 0,1,2,3. '{node}' in "
+                         "--input/--output/--checkpoint/--db is replaced by each id.")
+    ap.add_argument("--follow", action="store_true",
+                    help="Keep reading certificates appended to --input instead of stopping at EOF")
+    ap.add_argument("--poll-interval", type=float, default=0.5,
+                    help="Seconds between checks for new certificates with --follow (default: 0.5)")
+    ap.add_argument("--checkpoint", default=None,
+                    help="Path of the resume checkpoint (default: <output>.checkpoint)")
     ap.add_argument("--sailfish-cli", required=True, type=Path, help="Path to sailfish_batch_cli binary")
-    ap.add_argument("--db", dest="db_paths", action="append", type=Path, required=True,
-                    help="Path to a RocksDB worker store. Repeat for multiple workers.")
-    ap.add_argument("--retry-interval", type=float, default=2.0,
-                    help="Seconds to wait between retries when a batch is missing (default: 2.0)")
+    ap.add_argument("--db", dest="db_paths", action="append", required=True,
+                    help="RocksDB worker store as [WORKER_ID=]PATH. Repeat for multiple workers; "
+                         "without WORKER_ID the n-th --db is worker n.")
+    ap.add_argument("--no-serve", action="store_true",
+                    help="Fork sailfish_batch_cli once per digest instead of keeping a --serve process")
+    ap.add_argument("--window", type=int, default=32,
+                    help="Max certificates read ahead of the oldest unresolved batch; all of their "
+                         "missing batches are looked up concurrently (default: 32)")
+    ap.add_argument("--jobs", type=int, default=8,
+                    help="Concurrent sailfish_batch_cli processes with --no-serve (default: 8)")
+    ap.add_argument("--cache-size", type=int, default=4096,
+                    help="Batches kept in memory for the other nodes of this run (default: 4096)")
+    ap.add_argument("--batch-cache", default=None,
+                    help="Directory of the on-disk batch cache shared across runs "
+                         "(default: .batch_cache next to the output)")
+    ap.add_argument("--batch-cache-mb", type=int, default=1024,
+                    help="Size bound of the on-disk batch cache in MiB; 0 disables it (default: 1024)")
+    ap.add_argument("--retry-interval", type=float, default=0.25,
+                    help="Initial delay before retrying a missing batch; doubles per attempt, "
+                         "with jitter (default: 0.25)")
+    ap.add_argument("--max-retry-interval", type=float, default=8.0,
+                    help="Upper bound for the retry delay (default: 8.0)")
     ap.add_argument("--max-retries", type=int, default=120,
                     help="Max retries per missing batch (default: 120). Use -1 to retry indefinitely.")
     ap.add_argument("-v", "--verbose", action="count", default=0, help="Increase logging verbosity (-v, -vv)")
@@ -205,116 +946,97 @@ def main() -> int:
         level = logging.DEBUG
     logging.basicConfig(level=level, format="%(asctime)s %(levelname)s %(message)s")
 
-    # Load existing dict and derive processed set & next index
-    out_records: Dict[str, dict] = load_existing_output(args.output)
-    processed = set()
-    next_index = 0
-    if out_records:
-        try:
-            next_index = max(int(k) for k in out_records.keys()) + 1
-        except ValueError:
-            next_index = 0
-        for rec in out_records.values():
-            cid = rec.get("cert_id")
-            bd  = rec.get("batch_digest")
-            if cid and bd:
-                processed.add((cid, bd))
-    logging.info("Loaded %d existing batches from %s; next_index=%d", len(out_records), args.output, next_index)
+    node_ids = [n.strip() for n in args.nodes.split(",") if n.strip()] if args.nodes else ["0"]
+    if len(node_ids) > 1 and "{node}" not in args.output:
+        ap.error("--output must contain '{node}' when extracting several nodes")
+
+    nodes: List[NodeExtractor] = []
+    stores: Dict[Route, Path] = {}
+    for n in node_ids:
+        output_path = Path(node_path(args.output, n))
+        node_stores = parse_worker_stores([node_path(v, n) for v in args.db_paths])
+        stores.update({(n, w): p for w, p in node_stores.items()})
+        nodes.append(NodeExtractor(
+            n,
+            Path(node_path(args.input, n)),
+            output_path,
+            Path(node_path(args.checkpoint, n)) if args.checkpoint
+            else output_path.with_suffix(output_path.suffix + ".checkpoint"),
+            node_stores,
+            args.follow,
+            RetryScheduler(args.retry_interval, args.max_retry_interval, args.max_retries),
+        ))
 
-    since_last_snapshot = 0
-    cert_counter = 0
+    server = None if args.no_serve else SailfishBatchServer(args.sailfish_cli, stores)
+    pool = ThreadPoolExecutor(max_workers=max(1, args.jobs))
+    disk_cache = None
+    if args.batch_cache_mb > 0:
+        cache_dir = Path(args.batch_cache) if args.batch_cache else nodes[0].output_path.parent / ".batch_cache"
+        disk_cache = DiskBatchCache(cache_dir, args.batch_cache_mb * 1024 * 1024)
+        logging.info("Batch cache %s holds %d bytes", cache_dir, disk_cache.total_bytes)
+    cache = BatchCache(args.cache_size, disk_cache)
+    window = max(1, args.window)
 
     try:
-        for cert in iter_json_objects(args.input):
+        while True:
             if STOP_REQUESTED:
-                logging.warning("Stop requested; halting before next certificate.")
+                logging.warning("Stop requested; halting.")
                 break
 
-            cert_counter += 1
-            cert_id   = cert.get("id")
-            author    = cert.get("author")
-            round_num = cert.get("round")
-            payload   = cert.get("payload", {}) or {}
+            # 1) Read ahead while each node's reorder buffer has room
+            for node in nodes:
+                node.read_ahead(window)
 
-            if not payload:
-                logging.debug("Cert #%d has no payload; skipping.", cert_counter)
-                continue
+            # 2) Look up every due digest once for all nodes: from the cache, else in one call
+            now = time.monotonic()
+            due = {node.node: node.scheduler.due(now) for node in nodes}
+            wanted: Dict[str, Optional[Route]] = {}
+            for node_due in due.values():
+                for digest, route in node_due.items():
+                    if digest not in wanted and cache.get(digest) is None:
+                        wanted[digest] = route
+            fetched: Dict[str, List[str]] = {}
+            if wanted:
+                for digest, txs in fetch_batches(server, pool, args.sailfish_cli, stores, wanted).items():
+                    if txs:
+                        fetched[digest] = [normalize_tx_hex(t) for t in txs]
+                        cache.put(digest, fetched[digest])
+            now = time.monotonic()
+            for node in nodes:
+                results = {d: fetched.get(d) or cache.get(d) for d in due[node.node]}
+                # Batches fetched for another node resolve this node's copy early
+                results.update({d: txs for d, txs in fetched.items() if d in node.scheduler.waiting})
+                node.scheduler.resolve(results, now)
 
-            cert_transactions = cert.get("transactions") or {}
+            # 3) Emit resolved batches strictly in consensus order
+            for node in nodes:
+                node.emit()
 
-            # Deterministic per-cert order
-            for _i, (batch_digest, _worker_id) in enumerate(sorted(payload.items(), key=lambda kv: kv[0])):
-                if STOP_REQUESTED:
-                    logging.warning("Stop requested; halting in the middle of a certificate.")
-                    break
-
-                # Skip if already processed (supports skipping starting batches already present)
-                if cert_id and (cert_id, batch_digest) in processed:
-                    logging.debug("Skipping already-processed batch %s from cert %s", batch_digest, cert_id)
-                    continue
-
-                # 1) Try to use transactions from the certificate
-                txs = extract_transactions_from_cert_transactions_field(cert_transactions, batch_digest)
-
-                # 2) If missing, try CLI with retries
-                if txs is None:
-                    attempt = 0
-                    while True:
-                        if STOP_REQUESTED:
-                            logging.warning("Stop requested during retries; snapshotting and exiting.")
-                            snapshot_atomic(args.output, out_records)
-                            return 130
-                        attempt += 1
-                        txs = run_sailfish_cli(args.sailfish_cli, batch_digest, args.db_paths)
-                        if txs:
-                            logging.info("Fetched %d txs for %s (attempt %d)", len(txs), batch_digest, attempt)
-                            break
-                        if args.max_retries == -1:
-                            logging.info("No txs for %s yet (attempt %d). Retrying in %.2fs ...", batch_digest, attempt, args.retry_interval)
-                            time.sleep(args.retry_interval)
-                            continue
-                        if attempt >= args.max_retries:
-                            logging.error("Exhausted retries for %s after %d attempts.", batch_digest, attempt)
-                            snapshot_atomic(args.output, out_records)
-                            sys.exit(2)
-                        logging.info("Missing txs for %s (attempt %d). Retrying in %.2fs ...", batch_digest, attempt, args.retry_interval)
-                        time.sleep(args.retry_interval)
-
-                txs_norm = [normalize_tx_hex(t) for t in txs]
-
-                # Build record **without** embedding batch_index. Use key=str(next_index)
-                record = {
-                    "cert_id": cert_id,
-                    "round": round_num,
-                    "author": author,
-                    "batch_digest": batch_digest,
-                    "transactions": txs_norm,
-                    "blockhash": None,
-                    "blocknumber": -1,
-                }
-
-                out_records[str(next_index)] = record
-                next_index += 1
-                if cert_id:
-                    processed.add((cert_id, batch_digest))
-
-                since_last_snapshot += 1
-                if since_last_snapshot >= SNAPSHOT_EVERY:
-                    snapshot_atomic(args.output, out_records)
-                    since_last_snapshot = 0
-
-            if STOP_REQUESTED:
+            if any(node.scheduler.exhausted for node in nodes):
+                for node in nodes:
+                    node.close()
+                sys.exit(2)
+            if all(node.finished for node in nodes):
                 break
 
+            # 4) Nothing can progress until the next retry is due or a followed input grows
+            if not any(node.can_read(window) for node in nodes):
+                waits = [args.max_retry_interval]
+                waits += [d - time.monotonic() for d in (n.scheduler.next_due() for n in nodes) if d is not None]
+                if any(node.caught_up for node in nodes):
+                    waits.append(args.poll_interval)
+                time.sleep(max(0.0, min(waits)))
+
     except KeyboardInterrupt:
         logging.warning("KeyboardInterrupt; writing final snapshot and exiting.")
-        snapshot_atomic(args.output, out_records)
-        return 130
+    finally:
+        pool.shutdown(wait=False)
+        if server is not None:
+            server.close()
 
-    # Final snapshot
-    snapshot_atomic(args.output, out_records)
-    logging.info("Wrote %d batch records to %s", len(out_records), args.output)
-    return 0
+    for node in nodes:
+        node.close()
+    return 130 if any(node.scheduler.entries for node in nodes) else 0
 
 
 if __name__ == "__main__":
@@ -13,41 +13,14 @@ GRACE_PERIOD=10  # seconds to wait after Ctrl-C before force kill
 start() {
     echo "Starting tmux session '$SESSION'..."
 
-    # Create a new tmux session in detached mode with window node0
-    tmux new-session -d -s ${SESSION} -n node0
+    # One extractor for nodes 0-3: they share the batch lookups and cache
+    tmux new-session -d -s ${SESSION} -n extract
     tmux send-keys -t ${SESSION}:0 \
-      "python3 extract_batches_from_ordered_certs.py \
-        --input Output/.db-0/ordered_certificates.json \
-        --output Output/transactions_batch_node_0.json \
+      "python3 extract_batches_from_ordered_certs.py --nodes 0,1,2,3 \
+        --input 'Output/.db-{node}/ordered_certificates.json' \
+        --output 'Output/transactions_batch_node_{node}.batches' \
         --sailfish-cli ./target/release/sailfish_batch_cli \
-        --db Output/.db-0-0/ --db Output/.db-0-1 -vv" C-m
-
-    # Window 1: node 1
-    tmux new-window -t ${SESSION} -n node1
-    tmux send-keys -t ${SESSION}:1 \
-      "python3 extract_batches_from_ordered_certs.py \
-        --input Output/.db-1/ordered_certificates.json \
-        --output Output/transactions_batch_node_1.json \
-        --sailfish-cli ./target/release/sailfish_batch_cli \
-        --db Output/.db-1-0/ --db Output/.db-1-1 -vv" C-m
-
-    # Window 2: node 2
-    tmux new-window -t ${SESSION} -n node2
-    tmux send-keys -t ${SESSION}:2 \
-      "python3 extract_batches_from_ordered_certs.py \
-        --input Output/.db-2/ordered_certificates.json \
-        --output Output/transactions_batch_node_2.json \
-        --sailfish-cli ./target/release/sailfish_batch_cli \
-        --db Output/.db-2-0/ --db Output/.db-2-1 -vv" C-m
-
-    # Window 3: node 3
-    tmux new-window -t ${SESSION} -n node3
-    tmux send-keys -t ${SESSION}:3 \
-      "python3 extract_batches_from_ordered_certs.py \
-        --input Output/.db-3/ordered_certificates.json \
-        --output Output/transactions_batch_node_3.json \
-        --sailfish-cli ./target/release/sailfish_batch_cli \
-        --db Output/.db-3-0/ --db Output/.db-3-1 -vv" C-m
+        --db '0=Output/.db-{node}-0/' --db '1=Output/.db-{node}-1' --follow -vv" C-m
 
     # Attach to the session
     tmux select-window -t ${SESSION}:0
@@ -1,18 +1,22 @@
 #!/usr/bin/env python3
-import os
 import time
-import jwt
-import binascii
 import json
 import requests
 import sys
-from typing import Dict
+from concurrent.futures import ThreadPoolExecutor
+from typing import List
 from typing import Tuple
 
+from batchfile import JsonJournal, compare_transactions, open_batches
+from rpc_client import TokenProvider, jwt_provider, get_client
+
 
 # === USAGE & ARGUMENTS ===
-if len(sys.argv) != 4:
-    print("Usage: python3 nm_state_transition_with_retry2.py <batch_file> <log_file> <end_point>")
+# Extra endpoints after the first one are import-only: the first endpoint receives the txs and
+# builds each block, the others just import the built payload (newPayloadV4 + forkchoiceUpdatedV3)
+# without any tx submission or block building of their own.
+if len(sys.argv) < 4:
+    print("Usage: python3 nm_state_transition_with_retry3.py <batch_file> <log_file> <end_point> [<import_end_point> ...]")
     sys.exit(1)
 
 BATCH_FILE = sys.argv[1]
@@ -24,57 +28,33 @@ JWT_SECRET_PATH = "chain_data/jwt-secret"
 CHAIN_ID = 3151908
 #BATCH_FILE = "Output/transactions_batch.json"
 #LOG_FILE = "Output/transition_log.json"
-RETRY_LIMIT = 15
-RETRY_DELAY = 5
-POST_TX_SLEEP = 5
-
-if len(sys.argv) < 2:
-    print("Usage: python3 nm_state_transition_with_retry2.py <engine_host:port>")
-    sys.exit(1)
+# A batch gets BATCH_TIMEOUT seconds to become a block. Nothing waits a fixed time: the txpool
+# is polled (txpool_status) until it holds the whole batch, then getPayloadV4 until the payload
+# does, both with exponential backoff from BACKOFF_MIN up to BACKOFF_MAX seconds; a failed
+# attempt backs off the same way before the next one. The pool is waited on for at most
+# POOL_WAIT seconds, so building always gets a turn; after PAYLOAD_WAIT seconds an attempt is
+# retried from scratch.
+BATCH_TIMEOUT = 75
+BACKOFF_MIN = 0.01
+BACKOFF_MAX = 1.0
+POOL_WAIT = 5
+PAYLOAD_WAIT = 5
 
 ENGINE_URL = f"http://{sys.argv[3]}"
 
-global_id = 1
-
-def generate_jwt(path):
-    raw = open(path).read().strip()
-    if raw.startswith("0x"):
-        raw = raw[2:]
-    key = binascii.unhexlify(raw)
-    now = int(time.time())
-    token = jwt.encode({"iat": now, "exp": now + 300}, key, algorithm="HS256")
-    return token if isinstance(token, str) else token.decode()
+ENGINE = get_client(ENGINE_URL)
+IMPORT_URLS = [f"http://{host}" for host in sys.argv[4:]]
 
 def rpc_call(method, params, token):
-    global global_id
-    req_id = global_id; global_id += 1
-    headers = {
-        "Content-Type": "application/json",
-        "Authorization": f"Bearer {token}"
-    }
-    body = {"jsonrpc": "2.0", "id": req_id, "method": method, "params": params}
     print(f" \n RPC Call → {method} | Params: {json.dumps(params)}")
-    resp = requests.post(ENGINE_URL, headers=headers, json=body)
-    print(f"  RPC Response ← {method} | Status: {resp.status_code}")
-    resp.raise_for_status()
-    result = resp.json()
+    result = ENGINE.call(method, params, token)
+    print(f"  RPC Response ← {method}")
     print(f"  Response JSON: {json.dumps(result)}")
     return result
 
-def load_json(path) -> Dict:
-    if os.path.exists(path):
-        try:
-            with open(path) as f:
-                return json.load(f)
-        except Exception as e:
-            print(f"  Error loading {path}: {e}")
-    return {}
-
-def save_json(data, path):
-    os.makedirs(os.path.dirname(path), exist_ok=True)
-    with open(path, "w") as f:
-        json.dump(data, f, indent=2)
-    print(f"  Saved → {path}")
+def rpc_batch_call(method, params_list, token):
+    print(f" \n RPC Batch → {method} x{len(params_list)}")
+    return ENGINE.batch(method, params_list, token)
 
 # def all_txs_included(payload_result, batch_txs):
 #     included = payload_result.get("transactions", [])
@@ -90,21 +70,21 @@ def save_json(data, path):
 #     print(f"  Checking inclusion: {len(batch_txs)} txs vs payload {len(included)} txs")
 #     return all(tx.lower() in included_set for tx in batch_txs)
 def all_txs_exactly_match(payload_result, batch_txs):
-    exec_payload = payload_result.get("executionPayload", {})
-    included = exec_payload.get("transactions", [])
-
-    included_set = set(tx.lower() for tx in included)
-    batch_set = set(tx.lower() for tx in batch_txs)
-
-    print(f"  Checking inclusion: expected {len(batch_set)} txs vs payload {len(included_set)} txs")
-
-    if included_set != batch_set:
-        extra = included_set - batch_set
-        missing = batch_set - included_set
-        if extra:
-            print(f"   Extra txs in payload: {list(extra)[:2]}{'...' if len(extra) > 2 else ''}")
-        if missing:
-            print(f"   Missing txs in payload: {list(missing)[:2]}{'...' if len(missing) > 2 else ''}")
+    """The payload holds exactly the batch's txs, in the batch's order; prints the diff if not."""
+    included = payload_result.get("executionPayload", {}).get("transactions", [])
+    diff = compare_transactions(batch_txs, included)
+
+    print(f"  Checking inclusion: expected {diff['expected_count']} txs vs payload {diff['actual_count']} txs")
+
+    if not diff["match"]:
+        print(f"   First mismatch at index {diff['first_mismatch']}: "
+              f"expected {diff['expected_tx']} got {diff['actual_tx']}")
+        if diff["reordered"]:
+            print("   Payload holds the same txs in a different order")
+        if diff["extra"]:
+            print(f"   Extra txs in payload ({diff['extra']}): {diff['extra_txs']}")
+        if diff["missing"]:
+            print(f"   Missing txs in payload ({diff['missing']}): {diff['missing_txs']}")
         return False
 
     print("  Payload matches exactly.")
@@ -122,7 +102,7 @@ def get_latest_block_hash(token):
         except requests.exceptions.HTTPError as e:
                 if e.response.status_code == 401:
                     print("  JWT expired during get_latest_block_hash. Refreshing token...")
-                    token = generate_jwt(JWT_SECRET_PATH)
+                    token.refresh()
                 else:
                     raise
     print("  Failed to get latest block hash even after refreshing token.")
@@ -130,7 +110,7 @@ def get_latest_block_hash(token):
 
 
 
-def get_latest_block_info(token: str) -> Tuple[str, str]:
+def get_latest_block_info(token: TokenProvider) -> Tuple[str, str]:
     # Returns (head_hash, timestamp) from the latest block, with JWT refresh on 401.
     for attempt in range(2):
         try:
@@ -143,7 +123,7 @@ def get_latest_block_info(token: str) -> Tuple[str, str]:
         except requests.exceptions.HTTPError as e:
             if e.response.status_code == 401:
                 print("JWT expired during get_latest_block_info; refreshing token...")
-                token = generate_jwt(JWT_SECRET_PATH)
+                token.refresh()
             else:
                 raise
     print("Failed to get latest block info after refreshing token.")
@@ -151,51 +131,174 @@ def get_latest_block_info(token: str) -> Tuple[str, str]:
 
 
 
+class Backoff:
+    """Exponential backoff that counts its sleeps: the driver's wait metrics for one batch."""
+
+    def __init__(self, initial=BACKOFF_MIN, maximum=BACKOFF_MAX):
+        self.initial = initial
+        self.maximum = maximum
+        self.delay = initial
+        self.sleeps = 0
+        self.slept = 0.0
+
+    def reset(self):
+        self.delay = self.initial
+
+    def sleep(self):
+        time.sleep(self.delay)
+        self.sleeps += 1
+        self.slept += self.delay
+        self.delay = min(self.delay * 2, self.maximum)
+
+
+def pending_count(token):
+    """Pending txs in the pool according to txpool_status, or None if the client lacks it."""
+    resp = ENGINE.call("txpool_status", [], token)
+    pending = (resp.get("result") or {}).get("pending")
+    if pending is None:
+        return None
+    return int(pending, 16) if isinstance(pending, str) else int(pending)
+
+
+def wait_for_txpool(batch_txs, token, backoff, deadline, metrics):
+    """Return once the pool holds at least as many pending txs as the batch (or at the
+    deadline, or right away if the client has no txpool_status)."""
+    backoff.reset()
+    while True:
+        metrics["pool_polls"] += 1
+        try:
+            pending = pending_count(token)
+        except Exception as e:
+            print(f"  txpool_status failed: {e}")
+            return
+        if pending is None or pending >= len(batch_txs) or time.monotonic() >= deadline:
+            print(f"  Txpool ready: {pending} pending for {len(batch_txs)} txs")
+            return
+        backoff.sleep()
+
+
+def send_batch(key, batch_txs, token):
+    """Push every tx of a batch into the txpool, RPC_BATCH_SIZE (rpc_client) txs per request.
+    eth_sendRawTransaction only returns once the pool has accepted (or rejected) the tx, so the
+    batch is ready for building afterwards."""
+    try:
+        results = rpc_batch_call("eth_sendRawTransaction", [[tx] for tx in batch_txs], token)
+    except Exception as e:
+        print(f"  Batch {key} error sending txs: {e}")
+        return
+    for tx, res in zip(batch_txs, results):
+        print(f"  Batch {key} sent tx: {tx[:20]}... → {res.get('result') or res.get('error')}")
+
+
+def txs_match(payload_result, batch_txs) -> bool:
+    included = payload_result.get("executionPayload", {}).get("transactions", [])
+    return compare_transactions(batch_txs, included)["match"]
+
+
+def wait_for_payload(payload_id, batch_txs, token, backoff, metrics):
+    """Poll getPayloadV4 until the block being built holds the whole batch or PAYLOAD_WAIT
+    expires; return the last payload seen."""
+    deadline = time.monotonic() + PAYLOAD_WAIT
+    backoff.reset()
+    while True:
+        metrics["payload_polls"] += 1
+        pl_resp = rpc_call("engine_getPayloadV4", [payload_id], token)
+        payload = pl_resp.get("result", {})
+        if txs_match(payload, batch_txs) or time.monotonic() >= deadline:
+            return payload
+        backoff.sleep()
+
+
+def import_block(url, params, block_hash, token):
+    """Import a payload built elsewhere on `url` and make it head; return the newPayloadV4 status
+    (None if a call failed)."""
+    client = get_client(url)
+    try:
+        np_resp = client.call("engine_newPayloadV4", params, token)
+        status = np_resp.get("result", {}).get("status")
+        if status in ("VALID", "ACCEPTED"):
+            client.call("engine_forkchoiceUpdatedV3",
+                        [{"finalizedBlockHash": "0x" + "0"*64,
+                          "headBlockHash": block_hash,
+                          "safeBlockHash": "0x" + "0"*64}, None], token)
+        return status
+    except Exception as e:
+        print(f"  RPC error importing block on {url}: {e}")
+        return None
+
+
+def propagate(importer, params, block_hash, token):
+    """Import the block on every import-only endpoint at once; return {url: status}."""
+    futures = {url: importer.submit(import_block, url, params, block_hash, token)
+               for url in IMPORT_URLS}
+    statuses = {url: fut.result() for url, fut in futures.items()}
+    for url, status in statuses.items():
+        print(f"  Imported on {url} → {status}")
+    return statuses
+
+
 def main():
-    token = generate_jwt(JWT_SECRET_PATH)
+    token = jwt_provider(JWT_SECRET_PATH)
     print("Initialized JWT Token")
 
-    batches = load_json(BATCH_FILE)
-    log = load_json(LOG_FILE)
+    # *.batches files are read through their mmapped index; anything else is a JSON object
+    batches = open_batches(BATCH_FILE, writable=True)
+    # Each processed batch appends one line to the log's journal instead of rewriting the log
+    log = JsonJournal(LOG_FILE)
 
     print(f"Loaded {len(batches)} batches to process")
 
-    for key in sorted(batches.keys(), key=int):
-        batch = batches[key]
-        if batch.get("blockhash"):
-            print(f"Skipping batch {key}, already processed")
-            continue
-
+    # Batches before the first unprocessed one are never looked at again
+    first = batches.first_unprocessed()
+    pending: List[int] = []
+    if first is not None:
+        pending = [key for key in range(first, len(batches)) if not batches.block(key)[0]]
+    print(f"Skipping {len(batches) - len(pending)} batches already processed")
+
+    # Batch N+1 is pushed into the txpool by this thread as soon as block N has been imported
+    # and made head, while block N is recorded and propagated. It is never sent earlier: txs in
+    # the pool while block N is built would end up in block N.
+    sender = ThreadPoolExecutor(max_workers=1)
+    prefetched = {}
+    importer = ThreadPoolExecutor(max_workers=max(1, len(IMPORT_URLS)))
+    if IMPORT_URLS:
+        print(f"Building on {ENGINE_URL}, importing on {', '.join(IMPORT_URLS)}")
+
+    zero32 = "0x" + "0"*64
+    feeRecipient = "0xE25583099BA105D9ec0A67f5Ae86D90e50036425"
+    # The head is only read from the client for the first batch; afterwards it is the block
+    # this driver just built.
+    head_hash, head_timestamp = get_latest_block_info(token)
+    if not head_hash or not head_timestamp:
+        print("Cannot proceed without valid head info.")
+        sys.exit(1)
+
+    started = time.monotonic()
+    blocks = 0
+    totals = {"attempts": 0, "pool_polls": 0, "payload_polls": 0, "sleeps": 0, "slept_s": 0.0}
+    for pos, key in enumerate(pending):
         print(f"\n--- Processing batch {key} ---")
-        batch_txs = batch.get("transactions", [])
+        batch_txs = batches.transactions(key)
 
-        for tx in batch_txs:
-            try:
-                res = rpc_call("eth_sendRawTransaction", [tx], token)
-                print(f"  Sent tx: {tx[:20]}... → {res.get('result') or res.get('error')}")
-            except Exception as e:
-                print(f"  Error sending tx: {e}")
+        if key in prefetched:
+            prefetched.pop(key).result()
+        else:
+            send_batch(key, batch_txs, token)
 
-        print(f"  Sleeping for {POST_TX_SLEEP}s before checking transition...")
-        time.sleep(POST_TX_SLEEP)
+        block_ts = hex(int(head_timestamp, 16) + 10)
 
-        zero32 = "0x" + "0"*64
-        feeRecipient = "0xE25583099BA105D9ec0A67f5Ae86D90e50036425"
-        # head_hash = get_latest_block_hash(token)
-        head_hash,head_timestamp =get_latest_block_info(token)
-        block_ts=hex(int(head_timestamp,16)+10)
-        if not head_hash or not head_timestamp:
-            print("Cannot proceed without valid head info.")
-            sys.exit(1)
+        deadline = time.monotonic() + BATCH_TIMEOUT
+        backoff = Backoff()
+        metrics = {"attempts": 0, "pool_polls": 0, "payload_polls": 0}
+        wait_for_txpool(batch_txs, token, backoff, min(deadline, time.monotonic() + POOL_WAIT), metrics)
 
         included = False
-        for attempt in range(1, RETRY_LIMIT + 1):
-            print(f"  Attempt {attempt}/{RETRY_LIMIT}")
-            
-            if not head_hash:
-                print("  No head block available, retrying...")
-                time.sleep(RETRY_DELAY)
-                continue
+        retry = Backoff()
+        while not metrics["attempts"] or time.monotonic() < deadline:
+            if metrics["attempts"]:
+                retry.sleep()
+            metrics["attempts"] += 1
+            print(f"  Attempt {metrics['attempts']}")
 
             fc_state = {"finalizedBlockHash": zero32,
                         "headBlockHash": head_hash,
@@ -212,19 +315,17 @@ def main():
                 print(f"  Forkchoice response payloadId → {payload_id}")
             except Exception as e:
                 print(f"  RPC error during forkchoiceUpdatedV3: {e}")
-                token = generate_jwt(JWT_SECRET_PATH)
+                token.refresh()
                 continue
 
             if not payload_id:
-                time.sleep(RETRY_DELAY)
                 continue
 
             try:
-                pl_resp = rpc_call("engine_getPayloadV4", [payload_id], token)
-                payload = pl_resp.get("result", {})
+                payload = wait_for_payload(payload_id, batch_txs, token, backoff, metrics)
             except Exception as e:
                 print(f"  RPC error during getPayloadV4: {e}")
-                token = generate_jwt(JWT_SECRET_PATH)
+                token.refresh()
                 continue
 
             if all_txs_exactly_match(payload, batch_txs):
@@ -250,47 +351,81 @@ def main():
                     print(f"  newPayloadV4 status → {status}")
                 except Exception as e:
                     print(f"  RPC error during newPayloadV4: {e}")
-                    token = generate_jwt(JWT_SECRET_PATH)
+                    token.refresh()
                     continue
 
                 # if status == "VALID":
                 if status and status in ("VALID", "ACCEPTED"):
                     block_hash = execution_payload.get("blockHash")
                     block_number = int(execution_payload.get("blockNumber", "0x0"), 16)
-                    
-                    # Finalize the new head
-                    final_fc_state = {
-                        "finalizedBlockHash": zero32,
-                        "headBlockHash": block_hash,
-                        "safeBlockHash": zero32
-                    }
-                    try:
-                        fc_final = rpc_call("engine_forkchoiceUpdatedV3", [final_fc_state, None], token)
-                        print(f"  Final forkchoiceUpdatedV3 sent to confirm head → {block_hash}")
-                    except Exception as e:
-                        print(f"  RPC error during final forkchoiceUpdatedV3: {e}")
-                        token = generate_jwt(JWT_SECRET_PATH)
-                        continue
-                    
-                    
+
+                    # Make block N head. Only this call is retried: block N is already imported
+                    # and must not be built again.
+                    head_set = False
+                    while True:
+                        final_fc_state = {
+                            "finalizedBlockHash": zero32,
+                            "headBlockHash": block_hash,
+                            "safeBlockHash": zero32
+                        }
+                        try:
+                            rpc_call("engine_forkchoiceUpdatedV3", [final_fc_state, None], token)
+                            print(f"  Final forkchoiceUpdatedV3 sent to confirm head → {block_hash}")
+                            head_set = True
+                            break
+                        except Exception as e:
+                            print(f"  RPC error during final forkchoiceUpdatedV3: {e}")
+                            token.refresh()
+                            if time.monotonic() >= deadline:
+                                break
+                            retry.sleep()
+                    if not head_set:
+                        print(f"  Block {block_number} imported but never made head, giving up")
+                        break
+
+                    # Block N is head: start filling the txpool with batch N+1
+                    if pos + 1 < len(pending) and pending[pos + 1] not in prefetched:
+                        next_key = pending[pos + 1]
+                        prefetched[next_key] = sender.submit(
+                            send_batch, next_key, batches.transactions(next_key), token)
+
                     print(f"  Transition successful: block {block_number}, hash {block_hash}")
 
-                    batch["blockhash"] = block_hash
-                    batch["blocknumber"] = block_number
-                    log[key] = {"batch": key, "block_hash": block_hash, "block_number": block_number}
-                    save_json(log, LOG_FILE)
-                    save_json(batches, BATCH_FILE)
+                    head_hash = block_hash
+                    head_timestamp = execution_payload.get("timestamp", block_ts)
+                    batches.set_block(key, block_hash, block_number)
+                    entry = {"batch": str(key), "block_hash": block_hash, "block_number": block_number}
+                    if IMPORT_URLS:
+                        entry["imports"] = propagate(importer, params, block_hash, token)
                     included = True
+                    blocks += 1
                     break
                 else:
                     print("  newPayloadV4 invalid, aborting attempts")
                     break
             else:
                 print("  Not all txs found in payload, retrying...")
-                time.sleep(RETRY_DELAY)
 
-        if not included:
-            print("  Inclusion failed after retries")
+        metrics["sleeps"] = backoff.sleeps + retry.sleeps
+        metrics["slept_s"] = round(backoff.slept + retry.slept, 3)
+        for name, value in metrics.items():
+            totals[name] += value
+        print(f"  Wait metrics: {metrics}")
+        if included:
+            entry["metrics"] = metrics
+            log.put(str(key), entry)
+        else:
+            print(f"  Inclusion failed after {metrics['attempts']} attempts")
+
+    sender.shutdown(wait=True)
+    importer.shutdown(wait=True)
+    log.close(compact=True)
+    batches.close(compact=True)
+    elapsed = time.monotonic() - started
+    if blocks:
+        print(f"\n{blocks} blocks in {elapsed:.2f}s → {blocks / elapsed:.2f} blocks/s")
+    totals["slept_s"] = round(totals["slept_s"], 3)
+    print(f"Wait metrics: {totals}")
 
 if __name__ == "__main__":
     main()
@@ -7,6 +7,8 @@ use rocksdb::{DB, IteratorMode, Options};
 use serde_json::json;
 use std::collections::HashSet;
 use std::env;
+use std::io::{self, BufRead, Write};
+use std::path::{Path, PathBuf};
 use worker::WorkerMessage;
 
 fn decode_key_input(key_input: &str) -> Option<Vec<u8>> {
@@ -86,6 +88,133 @@ fn print_batch_from_dbs(db_paths: &[String], key_input: &str, json: bool) {
     println!("Batch not found in provided databases");
 }
 
+fn secondary_path(idx: usize) -> PathBuf {
+    env::temp_dir().join(format!("sailfish_batch_cli-{}-{}", std::process::id(), idx))
+}
+
+/// Open a worker store as a RocksDB secondary instance so that a long-lived
+/// process can observe batches written by the worker after it was opened.
+fn open_secondary(path: &str, idx: usize) -> DB {
+    let mut opts = Options::default();
+    opts.set_max_open_files(-1);
+    let secondary = secondary_path(idx);
+    DB::open_cf_as_secondary(&opts, Path::new(path), secondary.as_path(), vec!["default"])
+        .expect("Failed to open DB")
+}
+
+/// Look up every key in one pass per store: each store answers a single
+/// `multi_get` for the keys that earlier stores did not have. A key routed to a
+/// store index is only looked up in that store.
+fn lookup_batches(dbs: &[DB], keys: &[(Option<usize>, Vec<u8>)]) -> Vec<Option<Vec<Vec<u8>>>> {
+    let mut found: Vec<Option<Vec<Vec<u8>>>> = vec![None; keys.len()];
+    for (j, db) in dbs.iter().enumerate() {
+        let missing: Vec<usize> = (0..keys.len())
+            .filter(|&i| found[i].is_none() && keys[i].0.map_or(true, |route| route == j))
+            .collect();
+        if missing.is_empty() {
+            continue;
+        }
+        let cf = db
+            .cf_handle("default")
+            .expect("Missing 'default' column family");
+        let values = db.multi_get_cf(missing.iter().map(|&i| (cf, keys[i].1.as_slice())));
+        for (&i, value) in missing.iter().zip(values) {
+            if let Ok(Some(value)) = value {
+                if let Ok(WorkerMessage::Batch(txs)) = bincode::deserialize::<WorkerMessage>(&value) {
+                    found[i] = Some(txs);
+                }
+            }
+        }
+    }
+    found
+}
+
+/// Parse a serve-mode query: `<digest>` searches every store, `<index>:<digest>`
+/// only the store at position `index` on the command line.
+fn decode_query(query: &str, stores: usize) -> Option<(Option<usize>, Vec<u8>)> {
+    match query.split_once(':') {
+        Some((route, digest)) => {
+            let route = route.parse::<usize>().ok().filter(|&r| r < stores)?;
+            decode_key_input(digest).map(|key| (Some(route), key))
+        }
+        None => decode_key_input(query).map(|key| (None, key)),
+    }
+}
+
+/// Serve digest lookups over stdin/stdout. Each input line holds one or more
+/// whitespace-separated queries, each a digest (hex or base64) optionally
+/// prefixed with `<store index>:` to route it to one store; each is answered with
+/// one compact JSON object per output line, in request order. All digests of a
+/// line are resolved together, and the stores stay open for the lifetime of
+/// the process; if any digest misses, the stores it could live in catch up
+/// with their workers once and the misses are looked up again before answering.
+fn serve(db_paths: &[String]) {
+    let dbs: Vec<DB> = db_paths
+        .iter()
+        .enumerate()
+        .map(|(i, path)| open_secondary(path, i))
+        .collect();
+
+    let stdin = io::stdin();
+    let stdout = io::stdout();
+    let mut out = io::BufWriter::new(stdout.lock());
+    for line in stdin.lock().lines() {
+        let line = match line {
+            Ok(l) => l,
+            Err(_) => break,
+        };
+        let queries: Vec<&str> = line.split_whitespace().collect();
+        if queries.is_empty() {
+            continue;
+        }
+        let keys: Vec<Option<(Option<usize>, Vec<u8>)>> =
+            queries.iter().map(|q| decode_query(q, dbs.len())).collect();
+        let valid: Vec<(Option<usize>, Vec<u8>)> = keys.iter().flatten().cloned().collect();
+
+        let mut found = lookup_batches(&dbs, &valid);
+        let misses: Vec<usize> = (0..found.len()).filter(|&i| found[i].is_none()).collect();
+        if !misses.is_empty() {
+            for (j, db) in dbs.iter().enumerate() {
+                if misses.iter().any(|&i| valid[i].0.map_or(true, |route| route == j)) {
+                    let _ = db.try_catch_up_with_primary();
+                }
+            }
+            let retry: Vec<(Option<usize>, Vec<u8>)> =
+                misses.iter().map(|&i| valid[i].clone()).collect();
+            for (i, txs) in misses.into_iter().zip(lookup_batches(&dbs, &retry)) {
+                found[i] = txs;
+            }
+        }
+
+        let mut found = found.into_iter();
+        let mut ok = true;
+        for (query, key) in queries.iter().zip(&keys) {
+            let response = match key {
+                None => json!({ "query": query, "error": "invalid digest" }),
+                Some((_, key_bytes)) => {
+                    let txns = found
+                        .next()
+                        .flatten()
+                        .map(|txs| txs.iter().map(hex::encode).collect::<Vec<String>>());
+                    json!({ "query": query, "digest": hex::encode(key_bytes), "txns": txns })
+                }
+            };
+            if writeln!(out, "{}", response).is_err() {
+                ok = false;
+                break;
+            }
+        }
+        if !ok || out.flush().is_err() {
+            break;
+        }
+    }
+
+    drop(dbs);
+    for i in 0..db_paths.len() {
+        let _ = std::fs::remove_dir_all(secondary_path(i));
+    }
+}
+
 fn main() {
     let mut args: Vec<String> = env::args().skip(1).collect();
 
@@ -103,6 +232,22 @@ fn main() {
         false
     };
 
+    let serve_mode = if let Some(pos) = args.iter().position(|s| s == "--serve") {
+        args.remove(pos);
+        true
+    } else {
+        false
+    };
+
+    if serve_mode {
+        if args.is_empty() {
+            eprintln!("Usage: sailfish_batch_cli --serve <db_path> [db_path ...]");
+            std::process::exit(1);
+        }
+        serve(&args);
+        return;
+    }
+
     if list_mode {
         if args.is_empty() {
             eprintln!("Usage: sailfish_batch_cli [--json] --list <db_path> [db_path ...]");
@@ -0,0 +1,631 @@
+#!/usr/bin/env python3
+"""
+Binary container for ordered batches, shared by the extractor and the state-transition drivers.
+
+A batch file `<name>.batches` is accompanied by its index `<name>.batches.idx`:
+
+  <name>.batches       header, then one block per batch, appended in batch-index order:
+                         u16 len(cert_id), u16 len(author), u16 len(batch_digest), u32 tx count,
+                         cert_id, author, batch_digest (utf-8),
+                         u32 length of every transaction, then the raw transaction bytes
+  <name>.batches.idx   header (its last u32 is the cursor: the number of leading batches that
+                       have been executed), then one fixed-size entry per batch:
+                         u64 block offset, u32 block size, u32 tx count, i64 round,
+                         i64 blocknumber (-1 until executed), 32-byte blockhash (zero until executed)
+
+The batch index is the entry's position, so record `i` is found with one lookup in the mmapped
+index and one slice of the mmapped data; opening a file costs the same whatever its length. The
+only mutable fields, blockhash and blocknumber, live in the index and are updated in place, so
+recording an executed block writes 40 bytes instead of re-serializing every batch. Batches are
+executed in order, so the cursor makes finding the next pending batch a single lookup too.
+
+Appends write and fsync the block first, then its index entry, so readers never see an entry
+without its block. When the single appender opens the file (`repair=True`), a torn index entry
+and any data past the last indexed block are truncated away.
+
+`compare_transactions` is the drivers' check that a built payload holds exactly a batch, in order.
+
+Records have the same shape as the JSON batches object the tools used before:
+  {cert_id, round, author, batch_digest, transactions: ["0x..."], blockhash, blocknumber}
+`open_batches` returns the same interface over a legacy JSON object file (any other suffix).
+Changes to a JSON file go to the append-only journal `<name>.journal` (the extractor's format)
+that is folded back into the file once it holds as many entries as the file (`JsonJournal`), so
+each change appends one line instead of rewriting the file. Journal writers lock the journal
+while appending or compacting, so a driver and the extractor can share it.
+
+Run:
+  python3 batchfile.py convert Output/transactions_batch_node_0.json Output/transactions_batch_node_0.batches
+  python3 batchfile.py dump Output/transactions_batch_node_0.batches > batches.json
+  python3 batchfile.py info Output/transactions_batch_node_0.batches
+"""
+
+import bisect
+import fcntl
+import json
+import mmap
+import os
+import struct
+import sys
+from typing import Dict, Iterable, List, Optional, Tuple, Union
+
+BATCHES_SUFFIX = ".batches"
+INDEX_SUFFIX = ".idx"
+JOURNAL_SUFFIX = ".journal"
+# A journal is folded into its JSON file once it holds this many entries, or as many as the file
+JOURNAL_COMPACT_MIN = 64
+
+DATA_MAGIC = b"SFBATCH\x00"
+INDEX_MAGIC = b"SFBIDX\x00\x00"
+VERSION = 1
+HEADER = struct.Struct("<8sII")  # magic, version, reserved (index: cursor)
+CURSOR = struct.Struct("<I")
+CURSOR_OFFSET = HEADER.size - CURSOR.size
+BLOCK_HEADER = struct.Struct("<HHHI")
+TX_LENGTH = struct.Struct("<I")
+ENTRY = struct.Struct("<QIIqq32s")
+# Offset of (blocknumber, blockhash) within an index entry
+BLOCK_FIELDS = struct.Struct("<q32s")
+BLOCK_FIELDS_OFFSET = ENTRY.size - BLOCK_FIELDS.size
+
+NO_BLOCKHASH = bytes(32)
+
+
+def is_batch_file(path: str) -> bool:
+    return str(path).endswith(BATCHES_SUFFIX)
+
+
+def _read_header(f, magic: bytes, path: str) -> None:
+    raw = f.read(HEADER.size)
+    got, version, _ = HEADER.unpack(raw) if len(raw) == HEADER.size else (None, None, None)
+    if got != magic:
+        raise ValueError(f"{path} is not a batch file")
+    if version != VERSION:
+        raise ValueError(f"{path}: unsupported batch file version {version}")
+
+
+def _encode_block(record: dict) -> Tuple[bytes, int]:
+    txs = [_tx_bytes(tx) for tx in record.get("transactions") or []]
+    strings = [(record.get(k) or "").encode("utf-8") for k in ("cert_id", "author", "batch_digest")]
+    parts = [BLOCK_HEADER.pack(*(len(s) for s in strings), len(txs))]
+    parts += strings
+    parts += [TX_LENGTH.pack(len(tx)) for tx in txs]
+    parts += txs
+    return b"".join(parts), len(txs)
+
+
+def _tx_bytes(tx: str) -> bytes:
+    return bytes.fromhex(tx[2:] if tx[:2] in ("0x", "0X") else tx)
+
+
+def _tx_key(tx: str) -> Optional[bytes]:
+    """`_tx_bytes` for comparisons: None for a transaction that is not valid hex."""
+    try:
+        return _tx_bytes(tx)
+    except (ValueError, TypeError):
+        return None
+
+
+# Transactions listed in a comparison's diff, per kind
+DIFF_SAMPLE = 3
+
+
+def compare_transactions(expected: List[str], actual: List[str]) -> dict:
+    """Compare a batch's transactions with a payload's, in order: the same transactions in the
+    same positions (Sailfish fixes the order, so a reordered block is a mismatch). Hex case and
+    the 0x prefix are ignored. One pass over both lists; a pair is decoded to bytes only when its
+    strings differ, so identical lists cost no copies. A transaction that is not valid hex only
+    matches the identical string: any other pair with it diverges, and in the tails it counts as
+    missing or extra.
+
+    Returns {"match", "expected_count", "actual_count", "first_mismatch"} and, when they differ,
+    "expected_tx"/"actual_tx" at the first mismatch plus "missing"/"extra" (counts of
+    transactions only on one side, samples in "missing_txs"/"extra_txs") and "reordered" (same
+    transactions, different order)."""
+    first = None
+    for i, (e, a) in enumerate(zip(expected, actual)):
+        if e != a:
+            key = _tx_key(e)
+            if key is None or key != _tx_key(a):
+                first = i
+                break
+    else:
+        if len(expected) != len(actual):
+            first = min(len(expected), len(actual))
+    diff = {
+        "match": first is None,
+        "expected_count": len(expected),
+        "actual_count": len(actual),
+        "first_mismatch": first,
+    }
+    if first is None:
+        return diff
+
+    # Only the tails from the first mismatch on can differ in membership
+    counts: Dict[bytes, int] = {}
+    invalid = []
+    for tx in expected[first:]:
+        key = _tx_key(tx)
+        if key is None:
+            invalid.append(tx)
+        else:
+            counts[key] = counts.get(key, 0) + 1
+    extra_txs = []
+    for tx in actual[first:]:
+        key = _tx_key(tx)
+        if key is not None and counts.get(key):
+            counts[key] -= 1
+        else:
+            extra_txs.append(tx)
+    missing_txs = ["0x" + key.hex() for key, n in counts.items() for _ in range(n)] + invalid
+    diff.update({
+        "expected_tx": expected[first] if first < len(expected) else None,
+        "actual_tx": actual[first] if first < len(actual) else None,
+        "missing": len(missing_txs),
+        "extra": len(extra_txs),
+        "missing_txs": missing_txs[:DIFF_SAMPLE],
+        "extra_txs": extra_txs[:DIFF_SAMPLE],
+        "reordered": not missing_txs and not extra_txs,
+    })
+    return diff
+
+
+def _encode_blockhash(blockhash: Optional[str]) -> bytes:
+    if not blockhash:
+        return NO_BLOCKHASH
+    raw = bytes.fromhex(blockhash[2:] if blockhash[:2] in ("0x", "0X") else blockhash)
+    if len(raw) != 32:
+        raise ValueError(f"blockhash must be 32 bytes: {blockhash}")
+    return raw
+
+
+class BatchFile:
+    """Batches in the binary container at `path`, read through mmap. With `writable`, the file
+    is created if missing and batches can be appended and marked as executed. Only the file's
+    single appender opens it with `repair`, which drops a torn tail left by a crashed append:
+    anyone else could cut off a batch that is being appended."""
+
+    def __init__(self, path: str, writable: bool = False, repair: bool = False):
+        self.path = str(path)
+        self.index_path = self.path + INDEX_SUFFIX
+        self.writable = writable
+        self._data_map: Optional[mmap.mmap] = None
+        self._index_map: Optional[mmap.mmap] = None
+        self._count = 0
+
+        if writable:
+            for p, magic in ((self.path, DATA_MAGIC), (self.index_path, INDEX_MAGIC)):
+                os.makedirs(os.path.dirname(p) or ".", exist_ok=True)
+                try:
+                    f = open(p, "xb")
+                except FileExistsError:
+                    # An empty file is only rewritten by the appender
+                    if not repair or os.path.getsize(p):
+                        continue
+                    f = open(p, "wb")
+                with f:
+                    f.write(HEADER.pack(magic, VERSION, 0))
+                    f.flush()
+                    os.fsync(f.fileno())
+        mode = "r+b" if writable else "rb"
+        self._data = open(self.path, mode)
+        self._index = open(self.index_path, mode)
+        _read_header(self._data, DATA_MAGIC, self.path)
+        _read_header(self._index, INDEX_MAGIC, self.index_path)
+        self.refresh()
+        if writable and repair:
+            self._repair()
+
+    # ---------- reading ----------
+
+    def refresh(self) -> None:
+        """Pick up batches appended since opening (e.g. by the extractor, while a driver reads)."""
+        index_size = os.fstat(self._index.fileno()).st_size
+        count = (index_size - HEADER.size) // ENTRY.size
+        if count == self._count and self._index_map is not None:
+            return
+        self._count = count
+        for m in (self._data_map, self._index_map):
+            if m is not None:
+                m.close()
+        self._index_map = mmap.mmap(self._index.fileno(), 0, access=mmap.ACCESS_READ)
+        self._data_map = mmap.mmap(self._data.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def __len__(self) -> int:
+        return self._count
+
+    def indices(self) -> Iterable[int]:
+        return range(self._count)
+
+    def _entry(self, i: int) -> tuple:
+        if not 0 <= i < self._count:
+            raise IndexError(f"batch {i} out of range ({self._count} batches)")
+        return ENTRY.unpack_from(self._index_map, HEADER.size + i * ENTRY.size)
+
+    def _block(self, i: int) -> Tuple[memoryview, tuple, int]:
+        offset, size, _ntx, _round, _bn, _bh = self._entry(i)
+        if offset + size > len(self._data_map):
+            # Index entry written after the data was mapped
+            self._data_map.close()
+            self._data_map = mmap.mmap(self._data.fileno(), 0, access=mmap.ACCESS_READ)
+        block = memoryview(self._data_map)[offset:offset + size]
+        return block, BLOCK_HEADER.unpack_from(block), BLOCK_HEADER.size
+
+    def transactions(self, i: int) -> List[str]:
+        """Transactions of batch `i` as 0x-prefixed hex, without decoding its other fields."""
+        block, (l_cert, l_author, l_digest, ntx), pos = self._block(i)
+        try:
+            pos += l_cert + l_author + l_digest
+            lengths = struct.unpack_from(f"<{ntx}I", block, pos)
+            pos += 4 * ntx
+            txs = []
+            for n in lengths:
+                txs.append("0x" + block[pos:pos + n].hex())
+                pos += n
+            return txs
+        finally:
+            block.release()
+
+    def block(self, i: int) -> Tuple[Optional[str], int]:
+        """(blockhash or None, blocknumber) recorded for batch `i`."""
+        _o, _s, _n, _r, blocknumber, blockhash = self._entry(i)
+        return (None if blockhash == NO_BLOCKHASH else "0x" + blockhash.hex()), blocknumber
+
+    def record(self, i: int) -> dict:
+        _o, _s, _n, rnd, _bn, _bh = self._entry(i)
+        block, (l_cert, l_author, l_digest, _ntx), pos = self._block(i)
+        try:
+            fields = []
+            for n in (l_cert, l_author, l_digest):
+                fields.append(bytes(block[pos:pos + n]).decode("utf-8") or None)
+                pos += n
+        finally:
+            block.release()
+        blockhash, blocknumber = self.block(i)
+        return {
+            "cert_id": fields[0],
+            "round": None if rnd < 0 else rnd,
+            "author": fields[1],
+            "batch_digest": fields[2],
+            "transactions": self.transactions(i),
+            "blockhash": blockhash,
+            "blocknumber": blocknumber,
+        }
+
+    def _executed(self, i: int) -> bool:
+        end = HEADER.size + (i + 1) * ENTRY.size
+        return self._index_map[end - len(NO_BLOCKHASH):end] != NO_BLOCKHASH
+
+    def cursor(self) -> int:
+        """Number of leading batches known to be executed."""
+        return min(CURSOR.unpack_from(self._index_map, CURSOR_OFFSET)[0], self._count)
+
+    def first_unprocessed(self, start: int = 0) -> Optional[int]:
+        """Index of the first batch from `start` on without a blockhash, or None. Starts at the
+        cursor, so this is a single lookup while batches are executed in order."""
+        for i in range(max(start, self.cursor()), self._count):
+            if not self._executed(i):
+                return i
+        return None
+
+    # ---------- writing ----------
+
+    def _repair(self) -> None:
+        """Drop a torn index entry and any block that never got its index entry."""
+        index_end = HEADER.size + self._count * ENTRY.size
+        if os.fstat(self._index.fileno()).st_size != index_end:
+            self._index.truncate(index_end)
+        if self._count:
+            offset, size = self._entry(self._count - 1)[:2]
+            data_end = offset + size
+        else:
+            data_end = HEADER.size
+        if os.fstat(self._data.fileno()).st_size != data_end:
+            self._data.truncate(data_end)
+
+    def append(self, record: dict) -> int:
+        """Append `record` as the next batch and return its index."""
+        if not self.writable:
+            raise ValueError(f"{self.path} is opened read-only")
+        block, ntx = _encode_block(record)
+        rnd = record.get("round")
+        entry_fields = (
+            int(-1 if rnd is None else rnd),
+            int(record.get("blocknumber", -1) if record.get("blocknumber") is not None else -1),
+            _encode_blockhash(record.get("blockhash")),
+        )
+        offset = self._data.seek(0, os.SEEK_END)
+        self._data.write(block)
+        self._data.flush()
+        os.fsync(self._data.fileno())
+        self._index.seek(0, os.SEEK_END)
+        self._index.write(ENTRY.pack(offset, len(block), ntx, *entry_fields))
+        self._index.flush()
+        os.fsync(self._index.fileno())
+        self.refresh()
+        return self._count - 1
+
+    def set_block(self, i: int, blockhash: str, blocknumber: int) -> None:
+        """Record the block that executed batch `i`, in place."""
+        if not self.writable:
+            raise ValueError(f"{self.path} is opened read-only")
+        self._entry(i)
+        os.pwrite(
+            self._index.fileno(),
+            BLOCK_FIELDS.pack(int(blocknumber), _encode_blockhash(blockhash)),
+            HEADER.size + i * ENTRY.size + BLOCK_FIELDS_OFFSET,
+        )
+        cursor = self.cursor()
+        if i == cursor:
+            while cursor < self._count and self._executed(cursor):
+                cursor += 1
+            os.pwrite(self._index.fileno(), CURSOR.pack(cursor), CURSOR_OFFSET)
+        os.fsync(self._index.fileno())
+
+    def close(self, compact: bool = False) -> None:
+        """`compact` is accepted for `JsonBatches` compatibility; a batch file has no journal."""
+        for m in (self._data_map, self._index_map):
+            if m is not None:
+                m.close()
+        self._data_map = self._index_map = None
+        self._data.close()
+        self._index.close()
+
+    def __enter__(self) -> "BatchFile":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+def append_journal_line(journal, line: bytes) -> int:
+    """Append one JSON line to `journal` (opened "a+b") under an exclusive lock, fsync it and
+    return the journal's new size. A torn line left by a crashed writer is ended first, so it
+    cannot swallow this one; replays skip it."""
+    fcntl.flock(journal.fileno(), fcntl.LOCK_EX)
+    try:
+        size = os.fstat(journal.fileno()).st_size
+        if size and os.pread(journal.fileno(), 1, size - 1) != b"\n":
+            line = b"\n" + line
+        journal.write(line)
+        journal.flush()
+        os.fsync(journal.fileno())
+        return os.fstat(journal.fileno()).st_size
+    finally:
+        fcntl.flock(journal.fileno(), fcntl.LOCK_UN)
+
+
+class JsonJournal:
+    """A JSON object of objects at `path`, updated through an append-only journal. `put` writes one
+    JSON line `{"key": ..., "record": ...}` to `<path>.journal` and fsyncs it, the same journal
+    the extractor keeps for its JSON output; both may write it at once, so appends and
+    compactions hold a lock on it and never drop each other's lines. The journal is replayed on
+    open and folded into the file (atomically) once it is as long as the file, which keeps the
+    rewrites amortized O(1) per change, or on `close(compact=True)`."""
+
+    def __init__(self, path: str):
+        self.path = str(path)
+        self.journal_path = self.path + JOURNAL_SUFFIX
+        self._journal = None
+        self._entries = 0
+        self.data: Dict[str, dict] = self._read()
+
+    def _read(self) -> Dict[str, dict]:
+        """The file plus every valid line of its journal, as on disk now."""
+        data: Dict[str, dict] = {}
+        if os.path.exists(self.path):
+            with open(self.path, "r", encoding="utf-8") as f:
+                raw = json.load(f)
+            if not isinstance(raw, dict):
+                raise ValueError(f"{self.path} must be a JSON object")
+            data = {str(k): dict(v) for k, v in raw.items()}
+        self._entries = 0
+        if os.path.exists(self.journal_path):
+            with open(self.journal_path, "rb") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                        data[str(entry["key"])] = dict(entry["record"])
+                    except (ValueError, KeyError, TypeError):
+                        continue  # torn line of a crashed writer
+                    self._entries += 1
+        return data
+
+    def _open(self):
+        if self._journal is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            self._journal = open(self.journal_path, "a+b")
+        return self._journal
+
+    def put(self, key: str, record: dict) -> None:
+        append_journal_line(self._open(), json.dumps({"key": key, "record": record}).encode() + b"\n")
+        self.data[key] = record
+        self._entries += 1
+        if self._entries >= max(JOURNAL_COMPACT_MIN, len(self.data)):
+            self.compact()
+
+    def compact(self) -> None:
+        """Rewrite the file with every journaled change and empty the journal. Both are read
+        again under the journal lock, so lines other writers appended meanwhile are kept."""
+        self._rewrite(None)
+
+    def replace(self, data: Dict[str, dict]) -> None:
+        """Make `data` the whole content: rewrite the file with it and empty the journal."""
+        self._rewrite(dict(data))
+
+    def _rewrite(self, data: Optional[Dict[str, dict]]) -> None:
+        journal = self._open()
+        fcntl.flock(journal.fileno(), fcntl.LOCK_EX)
+        try:
+            if data is None:
+                data = self._read()
+            tmp = self.path + ".tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(data, f, indent=2)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp, self.path)
+            journal.truncate(0)
+            os.fsync(journal.fileno())
+        finally:
+            fcntl.flock(journal.fileno(), fcntl.LOCK_UN)
+        self.data.clear()
+        self.data.update(data)
+        self._entries = 0
+
+    def close(self, compact: bool = False) -> None:
+        if compact and self._entries:
+            self.compact()
+        if self._journal is not None:
+            self._journal.close()
+            self._journal = None
+
+
+class JsonBatches:
+    """The `BatchFile` interface over a legacy JSON object keyed by batch index. Changes are
+    journaled (see `JsonJournal`); `first_unprocessed` resumes from an in-memory cursor."""
+
+    def __init__(self, path: str, writable: bool = False):
+        self.path = str(path)
+        self.writable = writable
+        # position in the sorted indices of the first batch that may not have been executed
+        self._cursor = 0
+        self._load()
+
+    def _stamp(self) -> tuple:
+        stamp = []
+        for p in (self.path, self.path + JOURNAL_SUFFIX):
+            st = os.stat(p) if os.path.exists(p) else None
+            stamp.append(st and (st.st_size, st.st_mtime_ns))
+        return tuple(stamp)
+
+    def _load(self) -> None:
+        self._seen = self._stamp()
+        self.store = JsonJournal(self.path)
+        for k in list(self.store.data):
+            if str(int(k)) != k:
+                self.store.data[str(int(k))] = self.store.data.pop(k)
+        self.batches: Dict[str, dict] = self.store.data
+        self._order = sorted(int(k) for k in self.batches)
+        self._cursor = min(self._cursor, len(self._order))
+
+    def refresh(self) -> None:
+        """Reload if another process changed the file or its journal since it was read."""
+        if self._stamp() != self._seen:
+            self.store.close()
+            self._load()
+
+    def __len__(self) -> int:
+        return len(self.batches)
+
+    def indices(self) -> Iterable[int]:
+        return list(self._order)
+
+    def transactions(self, i: int) -> List[str]:
+        return list(self.batches[str(i)].get("transactions") or [])
+
+    def block(self, i: int) -> Tuple[Optional[str], int]:
+        item = self.batches[str(i)]
+        blocknumber = item.get("blocknumber")
+        return item.get("blockhash") or None, -1 if blocknumber is None else int(blocknumber)
+
+    def record(self, i: int) -> dict:
+        return dict(self.batches[str(i)])
+
+    def first_unprocessed(self, start: int = 0) -> Optional[int]:
+        pos = bisect.bisect_left(self._order, start)
+        from_cursor = pos <= self._cursor
+        pos = max(pos, self._cursor)
+        while pos < len(self._order) and self.batches[str(self._order[pos])].get("blockhash"):
+            pos += 1
+        if from_cursor:
+            self._cursor = pos
+        return self._order[pos] if pos < len(self._order) else None
+
+    def _save(self) -> None:
+        """Replace the file with the batches held in memory (`convert`)."""
+        self.store.replace(self.batches)
+        self._order = sorted(int(k) for k in self.batches)
+        self._seen = self._stamp()
+
+    def append(self, record: dict) -> int:
+        i = self._order[-1] + 1 if self._order else 0
+        self._put(str(i), dict(record))
+        self._order.append(i)
+        return i
+
+    def set_block(self, i: int, blockhash: str, blocknumber: int) -> None:
+        item = dict(self.batches[str(i)])
+        item["blockhash"] = blockhash
+        item["blocknumber"] = int(blocknumber)
+        self._put(str(i), item)
+
+    def _put(self, key: str, record: dict) -> None:
+        # Only our own change is accounted for: a change by another writer since the last load
+        # must still make `refresh` reload.
+        fresh = self._stamp() == self._seen
+        self.store.put(key, record)
+        if fresh:
+            self._seen = self._stamp()
+
+    def close(self, compact: bool = False) -> None:
+        """With `compact`, fold the journal into the file first, so plain JSON readers see every
+        recorded block."""
+        self.store.close(compact=compact)
+
+    def __enter__(self) -> "JsonBatches":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+def open_batches(path: str, writable: bool = False, repair: bool = False) -> Union[BatchFile, JsonBatches]:
+    """Open the batches at `path`: the binary container for `*.batches`, else a JSON object.
+    `repair` is for the appender only (see `BatchFile`)."""
+    if is_batch_file(path):
+        return BatchFile(path, writable=writable, repair=repair)
+    return JsonBatches(path, writable=writable)
+
+
+def main(argv: List[str]) -> int:
+    if len(argv) < 2 or argv[0] not in ("convert", "dump", "info"):
+        print("Usage: python3 batchfile.py convert <in> <out> | dump <file> | info <file>")
+        return 1
+    cmd, path = argv[0], argv[1]
+    with open_batches(path) as src:
+        if cmd == "info":
+            pending = src.first_unprocessed()
+            print(f"{path}: {len(src)} batches, first unprocessed: {pending}")
+        elif cmd == "dump":
+            json.dump({str(i): src.record(i) for i in src.indices()}, sys.stdout, indent=2)
+            print()
+        else:
+            if len(argv) != 3:
+                print("Usage: python3 batchfile.py convert <in> <out>")
+                return 1
+            out = argv[2]
+            if not is_batch_file(out):
+                with JsonBatches(out, writable=True) as dst:
+                    dst.batches.clear()
+                    dst.batches.update({str(i): src.record(i) for i in src.indices()})
+                    dst._save()
+            else:
+                with BatchFile(out, writable=True, repair=True) as dst:
+                    for i in src.indices():
+                        if i != len(dst):
+                            print(f"error: batch indices of {path} are not contiguous from {len(dst)} (got {i})")
+                            return 1
+                        dst.append(src.record(i))
+            # Read the output back: every batch must have the same transactions and block
+            with open_batches(out) as dst:
+                if list(dst.indices()) != list(src.indices()) or any(
+                        not compare_transactions(src.transactions(i), dst.transactions(i))["match"]
+                        or src.block(i)[1] != dst.block(i)[1] for i in src.indices()):
+                    print(f"error: {out} does not read back the {len(src)} batches of {path}")
+                    return 1
+            print(f"Converted {len(src)} batches: {path} -> {out}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -1,10 +1,8 @@
 #!/usr/bin/env python3
 import sys
 import time
-import json
-import binascii
-import requests
-import jwt
+
+from rpc_client import jwt_provider, rpc_call
 
 # === CONFIG ===
 JWT_SECRET_PATH = "chain_data/jwt-secret"
@@ -16,25 +14,6 @@ if len(sys.argv) < 2:
 
 ENDPOINTS = [f"http://{h}" for h in sys.argv[1:]]
 
-def generate_jwt(path):
-    raw = open(path).read().strip()
-    if raw.startswith(("0x","0X")):
-        raw = raw[2:]
-    key = binascii.unhexlify("".join(c for c in raw if c in "0123456789abcdefABCDEF"))
-    now = int(time.time())
-    token = jwt.encode({"iat": now, "exp": now + 300}, key, algorithm="HS256")
-    return token if isinstance(token, str) else token.decode()
-
-def rpc_call(url, method, params, token):
-    hdr = {
-      "Content-Type":  "application/json",
-      "Authorization": f"Bearer {token}"
-    }
-    body = {"jsonrpc":"2.0","id":1,"method":method,"params":params}
-    r = requests.post(url, headers=hdr, json=body)
-    r.raise_for_status()
-    return r.json()
-
 def check_consistency(token):
     block_nums = {}
     roots      = {}
@@ -71,7 +50,7 @@ def check_consistency(token):
     return True
 
 def main():
-    token = generate_jwt(JWT_SECRET_PATH)
+    token = jwt_provider(JWT_SECRET_PATH)
     print(f" Monitoring consistency across {len(ENDPOINTS)} endpoints every {POLL_INTERVAL}s…\n")
     while True:
         check_consistency(token)
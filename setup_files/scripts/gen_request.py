@@ -1,14 +1,13 @@
 
 #!/usr/bin/env python3
 import time
-import jwt
-import binascii
 import json
-import requests
 import sys
 from watchdog.observers import Observer
 from watchdog.events import FileSystemEventHandler
 
+from rpc_client import jwt_provider, get_client
+
 # === CONFIGURATION ===
 JWT_SECRET_PATH = "chain_data/jwt-secret"
 REQUEST_FILE = "rpc_request.json"
@@ -21,28 +20,12 @@ if len(sys.argv) < 2:
 
 TARGETS = [f"http://{target}" for target in sys.argv[1:]]
 
-# === JWT GENERATION ===
-def generate_jwt(secret_path):
-    with open(secret_path, "r") as f:
-        secret_hex = f.read().strip()
-    secret_bytes = binascii.unhexlify(secret_hex)
-    payload = {"iat": int(time.time())}
-    token = jwt.encode(payload, secret_bytes, algorithm='HS256')
-    if isinstance(token, bytes):
-        token = token.decode("utf-8")
-    return token
-
 # === SEND REQUEST TO TARGET CLIENTS ===
 def send_request_to_clients(request_data, jwt_token):
     responses = {}
     for url in TARGETS:
-        headers = {
-            "Content-Type": "application/json",
-            "Authorization": f"Bearer {jwt_token}"
-        }
         try:
-            response = requests.post(url, headers=headers, data=json.dumps(request_data))
-            responses[url] = response.json()
+            responses[url] = get_client(url).post(request_data, jwt_token)
         except Exception as e:
             responses[url] = {"error": str(e)}
     return responses
@@ -54,7 +37,7 @@ class RequestFileHandler(FileSystemEventHandler):
             try:
                 with open(REQUEST_FILE, 'r') as f:
                     request_data = json.load(f)
-                jwt_token = generate_jwt(JWT_SECRET_PATH)
+                jwt_token = jwt_provider(JWT_SECRET_PATH)
                 responses = send_request_to_clients(request_data, jwt_token)
 
                 print("\n=== Responses ===")
@@ -1,13 +1,11 @@
 #!/usr/bin/env python3
 import os
-import time
-import jwt
 import binascii
-import json
-import requests
 from eth_account import Account
 from bip_utils import Bip39SeedGenerator, Bip44, Bip44Coins, Bip44Changes
 
+from rpc_client import jwt_provider, get_client
+
 # === CONFIGURATION ===
 MNEMONIC           = "giant issue aisle success illegal bike spike question tent bar rely arctic volcano long crawl hungry vocal artwork sniff fantasy very lucky have athlete"
 JWT_SECRET_PATH    = "chain_data/jwt-secret"
@@ -20,37 +18,12 @@ OUTPUT_DIR         = "Output"
 
 RPC_URL            = "http://127.0.0.1:8545"  # Replace if needed
 
-# global counter for JSON-RPC ids
-global_id = 1
-
-def generate_jwt(path):
-    raw = open(path).read().strip()
-    if raw.startswith(("0x", "0X")):
-        raw = raw[2:]
-    key = binascii.unhexlify("".join(c for c in raw if c in "0123456789abcdefABCDEF"))
-    now = int(time.time())
-    token = jwt.encode({"iat": now, "exp": now + 300}, key, algorithm="HS256")
-    return token if isinstance(token, str) else token.decode()
 
 def rpc_call(method, params, token):
-    global global_id
-    req_id = global_id; global_id += 1
-    headers = {
-      "Content-Type": "application/json",
-      "Authorization": f"Bearer {token}"
-    }
-    body = {
-      "jsonrpc": "2.0",
-      "id":      req_id,
-      "method":  method,
-      "params":  params
-    }
-    r = requests.post(RPC_URL, headers=headers, json=body)
-    r.raise_for_status()
-    return r.json()
+    return get_client(RPC_URL).call(method, params, token)
 
 def main():
-    token = generate_jwt(JWT_SECRET_PATH)
+    token = jwt_provider(JWT_SECRET_PATH)
     gas_price = int(rpc_call("eth_gasPrice", [], token)["result"], 16)
 
     # derive accounts from mnemonic
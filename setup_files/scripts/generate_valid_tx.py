@@ -1,14 +1,12 @@
 #!/usr/bin/env python3
 import argparse
 import binascii
-import json
 import os
-import time
-import jwt
-import requests
 from eth_account import Account
 from bip_utils import Bip39SeedGenerator, Bip44, Bip44Coins, Bip44Changes
 
+from rpc_client import jwt_provider, rpc_call
+
 # === CONFIGURATION ===
 MNEMONIC = "giant issue aisle success illegal bike spike question tent bar rely arctic volcano long crawl hungry vocal artwork sniff fantasy very lucky have athlete"
 CHAIN_ID = 3151908
@@ -17,33 +15,6 @@ GAS_LIMIT = 21000
 JWT_SECRET_PATH = "chain_data/jwt-secret"
 
 # JSON-RPC global ID counter
-global_id = 1
-
-def generate_jwt(path):
-    raw = open(path).read().strip()
-    if raw.startswith("0x"):
-        raw = raw[2:]
-    key = binascii.unhexlify("".join(c for c in raw if c in "0123456789abcdefABCDEF"))
-    now = int(time.time())
-    token = jwt.encode({"iat": now, "exp": now + 300}, key, algorithm="HS256")
-    return token if isinstance(token, str) else token.decode()
-
-def rpc_call(url, method, params, token):
-    global global_id
-    req_id = global_id; global_id += 1
-    hdr = {
-        "Content-Type": "application/json",
-        "Authorization": f"Bearer {token}"
-    }
-    body = {
-        "jsonrpc": "2.0",
-        "id": req_id,
-        "method": method,
-        "params": params
-    }
-    r = requests.post(url, headers=hdr, json=body)
-    r.raise_for_status()
-    return r.json()
 
 def main():
     parser = argparse.ArgumentParser()
@@ -53,7 +24,7 @@ def main():
     parser.add_argument("--path", type=str, required=True, help="Directory path for output file")
     args = parser.parse_args()
 
-    token = generate_jwt(JWT_SECRET_PATH)
+    token = jwt_provider(JWT_SECRET_PATH)
 
     seed = Bip39SeedGenerator(MNEMONIC).Generate()
     bip44 = Bip44.FromSeed(seed, Bip44Coins.ETHEREUM)
@@ -1,13 +1,12 @@
 #!/usr/bin/env python3
 import os
 import time
-import jwt
-import binascii
 import json
-import requests
 import sys
 from typing import Dict
 
+from rpc_client import jwt_provider, get_client, request_body
+
 # === CONFIGURATION ===
 JWT_SECRET_PATH = "chain_data/jwt-secret"
 CHAIN_ID = 3151908
@@ -23,31 +22,15 @@ if len(sys.argv) < 2:
 
 ENGINE_URL = f"http://{sys.argv[1]}"
 
-# global counter for JSON-RPC ids
-global_id = 1
-
-def generate_jwt(path):
-    raw = open(path).read().strip()
-    if raw.startswith("0x"):
-        raw = raw[2:]
-    key = binascii.unhexlify(raw)
-    now = int(time.time())
-    token = jwt.encode({"iat": now, "exp": now + 300}, key, algorithm="HS256")
-    return token if isinstance(token, str) else token.decode()
+# keep-alive client for the engine endpoint
+ENGINE = get_client(ENGINE_URL)
 
 def rpc_call(method, params, token):
-    global global_id
-    req_id = global_id; global_id += 1
-    headers = {
-        "Content-Type": "application/json",
-        "Authorization": f"Bearer {token}"
-    }
-    body = {"jsonrpc": "2.0", "id": req_id, "method": method, "params": params}
+    body = request_body(method, params)
     print(f"  RPC Call → {method} | Params: {json.dumps(params)[:100]}...")
-    resp = requests.post(ENGINE_URL, headers=headers, json=body)
-    print(f"  RPC Response ← {method} | Status: {resp.status_code}")
-    resp.raise_for_status()
-    return resp.json()
+    result = ENGINE.post(body, token)
+    print(f"  RPC Response ← {method}")
+    return result
 
 def load_json(path) -> Dict:
     if os.path.exists(path):
@@ -78,7 +61,7 @@ def get_latest_block_hash(token):
     return hash
 
 def main():
-    token = generate_jwt(JWT_SECRET_PATH)
+    token = jwt_provider(JWT_SECRET_PATH)
     print("Initialized JWT Token")
 
     batches = load_json(BATCH_FILE)
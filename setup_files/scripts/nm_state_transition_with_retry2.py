@@ -1,13 +1,13 @@
 #!/usr/bin/env python3
 import os
 import time
-import jwt
-import binascii
 import json
 import requests
 import sys
 from typing import Dict
 
+from rpc_client import jwt_provider, get_client, request_body
+
 
 # === USAGE & ARGUMENTS ===
 if len(sys.argv) != 4:
@@ -33,30 +33,13 @@ if len(sys.argv) < 2:
 
 ENGINE_URL = f"http://{sys.argv[3]}"
 
-global_id = 1
-
-def generate_jwt(path):
-    raw = open(path).read().strip()
-    if raw.startswith("0x"):
-        raw = raw[2:]
-    key = binascii.unhexlify(raw)
-    now = int(time.time())
-    token = jwt.encode({"iat": now, "exp": now + 300}, key, algorithm="HS256")
-    return token if isinstance(token, str) else token.decode()
+ENGINE = get_client(ENGINE_URL)
 
 def rpc_call(method, params, token):
-    global global_id
-    req_id = global_id; global_id += 1
-    headers = {
-        "Content-Type": "application/json",
-        "Authorization": f"Bearer {token}"
-    }
-    body = {"jsonrpc": "2.0", "id": req_id, "method": method, "params": params}
+    body = request_body(method, params)
     print(f" \n RPC Call → {method} | Params: {json.dumps(params)}")
-    resp = requests.post(ENGINE_URL, headers=headers, json=body)
-    print(f"  RPC Response ← {method} | Status: {resp.status_code}")
-    resp.raise_for_status()
-    result = resp.json()
+    result = ENGINE.post(body, token)
+    print(f"  RPC Response ← {method}")
     print(f"  Response JSON: {json.dumps(result)}")
     return result
 
@@ -121,7 +104,7 @@ def get_latest_block_hash(token):
         except requests.exceptions.HTTPError as e:
                 if e.response.status_code == 401:
                     print("  JWT expired during get_latest_block_hash. Refreshing token...")
-                    token = generate_jwt(JWT_SECRET_PATH)
+                    token.refresh()
                 else:
                     raise
     print("  Failed to get latest block hash even after refreshing token.")
@@ -130,7 +113,7 @@ def get_latest_block_hash(token):
     
 
 def main():
-    token = generate_jwt(JWT_SECRET_PATH)
+    token = jwt_provider(JWT_SECRET_PATH)
     print("Initialized JWT Token")
 
     batches = load_json(BATCH_FILE)
@@ -184,7 +167,7 @@ def main():
                 print(f"  Forkchoice response payloadId → {payload_id}")
             except Exception as e:
                 print(f"  RPC error during forkchoiceUpdatedV3: {e}")
-                token = generate_jwt(JWT_SECRET_PATH)
+                token.refresh()
                 continue
 
             if not payload_id:
@@ -196,7 +179,7 @@ def main():
                 payload = pl_resp.get("result", {})
             except Exception as e:
                 print(f"  RPC error during getPayloadV4: {e}")
-                token = generate_jwt(JWT_SECRET_PATH)
+                token.refresh()
                 continue
 
             if all_txs_exactly_match(payload, batch_txs):
@@ -222,7 +205,7 @@ def main():
                     print(f"  newPayloadV4 status → {status}")
                 except Exception as e:
                     print(f"  RPC error during newPayloadV4: {e}")
-                    token = generate_jwt(JWT_SECRET_PATH)
+                    token.refresh()
                     continue
 
                 # if status == "VALID":
@@ -241,7 +224,7 @@ def main():
                         print(f"  Final forkchoiceUpdatedV3 sent to confirm head → {block_hash}")
                     except Exception as e:
                         print(f"  RPC error during final forkchoiceUpdatedV3: {e}")
-                        token = generate_jwt(JWT_SECRET_PATH)
+                        token.refresh()
                         continue
                     
                     
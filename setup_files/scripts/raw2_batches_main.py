@@ -1,14 +1,13 @@
 #!/usr/bin/env python3
 import os
-import time
-import jwt
 import binascii
 import json
-import requests
 from eth_account import Account
 from bip_utils import Bip39SeedGenerator, Bip44, Bip44Coins, Bip44Changes
 import sys
 
+from rpc_client import jwt_provider, rpc_call, rpc_batch_call
+
 # === CONFIGURATION ===
 
 MNEMONIC           = "giant issue aisle success illegal bike spike question tent bar rely arctic volcano long crawl hungry vocal artwork sniff fantasy very lucky have athlete"
@@ -27,36 +26,6 @@ if len(sys.argv) < 2:
 
 ENDPOINTS = [f"http://{h}" for h in sys.argv[1:]]
 
-# global counter for JSON-RPC ids
-global_id = 1
-
-
-def generate_jwt(path):
-    raw = open(path).read().strip()
-    if raw.startswith(("0x", "0X")):
-        raw = raw[2:]
-    key = binascii.unhexlify("".join(c for c in raw if c in "0123456789abcdefABCDEF"))
-    now = int(time.time())
-    token = jwt.encode({"iat": now, "exp": now + 300}, key, algorithm="HS256")
-    return token if isinstance(token, str) else token.decode()
-
-
-def rpc_call(url, method, params, token):
-    global global_id
-    req_id = global_id; global_id += 1
-    hdr = {
-      "Content-Type": "application/json",
-      "Authorization": f"Bearer {token}"
-    }
-    body = {
-      "jsonrpc": "2.0",
-      "id":      req_id,
-      "method":  method,
-      "params":  params
-    }
-    r = requests.post(url, headers=hdr, json=body)
-    r.raise_for_status()
-    return r.json()
 
 
 def load_batches():
@@ -76,7 +45,7 @@ def save_batches(batches):
         json.dump(batches, f, indent=2)
 
 def main():
-    token = generate_jwt(JWT_SECRET_PATH)
+    token = jwt_provider(JWT_SECRET_PATH)
 
     # determine next batch number
     batches = load_batches()
@@ -92,6 +61,7 @@ def main():
 
     # collect raw txs for this batch
     batch_txs = []
+    senders = []
 
     # Example: send 5 transactions (customize as needed)
     for i in range(5):
@@ -117,12 +87,6 @@ def main():
         raw_hex = "0x" + raw_tx
 
 
-        for url in ENDPOINTS:
-            resp = rpc_call(url, "eth_sendRawTransaction", [raw_hex], token)
-            result = resp.get("result") or resp.get("error")
-            print(f"{url}  Tx {i+1} → {sender[:8]} | {result}")
-
-
         # # send the transaction
         # resp = rpc_call("eth_sendRawTransaction", [raw_hex], token)
         # result = resp.get("result") or resp.get("error")
@@ -130,6 +94,14 @@ def main():
 
         # append to batch
         batch_txs.append(raw_hex)
+        senders.append(sender)
+
+    # send the whole batch to every endpoint, RPC_BATCH_SIZE txs per request
+    for url in ENDPOINTS:
+        responses = rpc_batch_call(url, "eth_sendRawTransaction", [[raw_hex] for raw_hex in batch_txs], token)
+        for i, (sender, resp) in enumerate(zip(senders, responses)):
+            result = resp.get("result") or resp.get("error")
+            print(f"{url}  Tx {i+1} → {sender[:8]} | {result}")
 
     # record batch
     batches[batch_key] = {
@@ -0,0 +1,254 @@
+#!/usr/bin/env python3
+"""
+Shared JSON-RPC client for the Engine API and eth_ endpoints of the Nethermind clients.
+
+Every endpoint URL gets one persistent `requests.Session` with its own keep-alive connection
+pool, so consecutive calls reuse TCP connections instead of paying a handshake each. Calls have
+connect/read timeouts, JSON-RPC ids come from one process-wide counter, and
+`rpc_batch_call` sends many calls as JSON-RPC 2.0 batch arrays.
+
+`AsyncRpcClient` offers the same calls as coroutines for asyncio code.
+
+Engine API tokens come from a `TokenProvider` per secret file (`jwt_provider`): the secret is
+read once, and the signed token is cached and re-signed by a background thread every
+TOKEN_REFRESH seconds, well inside the ±60 s `iat` window the clients enforce, so calls never
+wait on disk or on a rejected request. Pass the provider itself as `token`; a 401 still makes
+the client re-sign and retry once.
+
+Defaults can be overridden through the environment:
+  RPC_POOL_SIZE        connections kept per endpoint (default: 16)
+  RPC_CONNECT_TIMEOUT  seconds to establish a connection (default: 5)
+  RPC_READ_TIMEOUT     seconds to wait for a response (default: 60)
+  RPC_BATCH_SIZE       calls per JSON-RPC batch request (default: 500)
+
+Usage:
+  from rpc_client import jwt_provider, rpc_call, rpc_batch_call
+
+  token = jwt_provider("chain_data/jwt-secret")
+  head = rpc_call("http://127.0.0.1:8545", "eth_blockNumber", [], token)["result"]
+"""
+
+import asyncio
+import binascii
+import itertools
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+import jwt
+import requests
+from requests.adapters import HTTPAdapter
+
+POOL_SIZE = int(os.environ.get("RPC_POOL_SIZE", "16"))
+CONNECT_TIMEOUT = float(os.environ.get("RPC_CONNECT_TIMEOUT", "5"))
+READ_TIMEOUT = float(os.environ.get("RPC_READ_TIMEOUT", "60"))
+RPC_BATCH_SIZE = int(os.environ.get("RPC_BATCH_SIZE", "500"))
+
+# Tokens are valid for TOKEN_TTL seconds, but the Engine API also rejects an `iat` more than
+# 60 s from its clock, so they are re-signed every TOKEN_REFRESH seconds in the background and,
+# should that thread fall behind, on use once older than TOKEN_MAX_AGE.
+TOKEN_TTL = 300
+TOKEN_REFRESH = 30
+TOKEN_MAX_AGE = 45
+
+Timeout = Union[float, Tuple[float, float]]
+# A token string, or a TokenProvider whose current token is used for each request
+Token = Union[str, "TokenProvider", None]
+
+# next() on a count is atomic, so ids stay unique across threads
+_request_ids = itertools.count(1)
+
+
+def next_request_id() -> int:
+    return next(_request_ids)
+
+
+def read_jwt_secret(path: str) -> bytes:
+    raw = open(path).read().strip()
+    if raw.startswith(("0x", "0X")):
+        raw = raw[2:]
+    return binascii.unhexlify("".join(c for c in raw if c in "0123456789abcdefABCDEF"))
+
+
+class TokenProvider:
+    """Cached Engine API tokens (HS256) for the secret at `path`, kept fresh by a daemon thread.
+    `str(provider)` is the current token, so it can stand in wherever a token string is used."""
+
+    def __init__(self, path: str, refresh_interval: float = TOKEN_REFRESH):
+        self.key = read_jwt_secret(path)
+        self.refresh_interval = refresh_interval
+        self._lock = threading.Lock()
+        self._token = ""
+        self._signed_at = 0.0
+        self.refresh()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="jwt-refresh", daemon=True)
+        self._thread.start()
+
+    def refresh(self) -> str:
+        """Sign a new token now and return it."""
+        now = int(time.time())
+        token = jwt.encode({"iat": now, "exp": now + TOKEN_TTL}, self.key, algorithm="HS256")
+        token = token if isinstance(token, str) else token.decode()
+        with self._lock:
+            self._token, self._signed_at = token, time.monotonic()
+        return token
+
+    def token(self) -> str:
+        with self._lock:
+            token, age = self._token, time.monotonic() - self._signed_at
+        return token if age < TOKEN_MAX_AGE else self.refresh()
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.refresh_interval):
+            self.refresh()
+
+    def close(self) -> None:
+        self._stop.set()
+
+    def __str__(self) -> str:
+        return self.token()
+
+
+_providers: Dict[str, TokenProvider] = {}
+_providers_lock = threading.Lock()
+
+
+def jwt_provider(path: str) -> TokenProvider:
+    """The process-wide token provider for the secret at `path`, created on first use."""
+    with _providers_lock:
+        provider = _providers.get(path)
+        if provider is None:
+            provider = _providers[path] = TokenProvider(path)
+        return provider
+
+
+def generate_jwt(path: str) -> str:
+    """A current Engine API token for the secret at `path` (cached; see `TokenProvider`)."""
+    return jwt_provider(path).token()
+
+
+def request_body(method: str, params: Any) -> dict:
+    return {"jsonrpc": "2.0", "id": next_request_id(), "method": method, "params": params}
+
+
+def match_batch_responses(requests_body: List[dict], data: Any) -> List[dict]:
+    """Order the responses of a JSON-RPC batch like its requests. A single error object (e.g.
+    from a server without batch support) is the answer to every request."""
+    if not isinstance(data, list):
+        return [data] * len(requests_body)
+    by_id = {r.get("id"): r for r in data if isinstance(r, dict)}
+    missing = {"code": -32603, "message": "no response in batch"}
+    return [by_id.get(req["id"], {"jsonrpc": "2.0", "id": req["id"], "error": missing})
+            for req in requests_body]
+
+
+class RpcClient:
+    """Keep-alive JSON-RPC client for one endpoint, safe to share between threads."""
+
+    def __init__(self, url: str, pool_size: int = POOL_SIZE,
+                 timeout: Timeout = (CONNECT_TIMEOUT, READ_TIMEOUT)):
+        self.url = url
+        self.timeout = timeout
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def post(self, body: Any, token: Token = None, timeout: Optional[Timeout] = None) -> Any:
+        """POST a request object or batch array; return the decoded JSON response. With a
+        `TokenProvider`, a 401 re-signs the token and retries once."""
+        resp = self._send(body, token, timeout)
+        if resp.status_code == 401 and isinstance(token, TokenProvider):
+            token.refresh()
+            resp = self._send(body, token, timeout)
+        resp.raise_for_status()
+        return resp.json()
+
+    def _send(self, body: Any, token: Token, timeout: Optional[Timeout]) -> requests.Response:
+        headers = {"Content-Type": "application/json"}
+        if token:
+            headers["Authorization"] = f"Bearer {token}"
+        return self.session.post(self.url, headers=headers, json=body, timeout=timeout or self.timeout)
+
+    def call(self, method: str, params: Any, token: Token = None,
+             timeout: Optional[Timeout] = None) -> dict:
+        return self.post(request_body(method, params), token, timeout)
+
+    def batch(self, method: str, params_list: List[Any], token: Token = None,
+              chunk_size: int = RPC_BATCH_SIZE) -> List[dict]:
+        """Call `method` once per entry of `params_list`, as batch arrays of up to `chunk_size`
+        calls per HTTP request. Returns one response object per entry, in order; an entry the
+        server did not answer gets an error."""
+        responses: List[dict] = []
+        for start in range(0, len(params_list), chunk_size):
+            body = [request_body(method, params) for params in params_list[start:start + chunk_size]]
+            responses.extend(match_batch_responses(body, self.post(body, token)))
+        return responses
+
+    def close(self) -> None:
+        self.session.close()
+
+
+_clients: Dict[str, RpcClient] = {}
+_clients_lock = threading.Lock()
+
+
+def get_client(url: str) -> RpcClient:
+    """The process-wide client for `url`, created on first use."""
+    with _clients_lock:
+        client = _clients.get(url)
+        if client is None:
+            client = _clients[url] = RpcClient(url)
+        return client
+
+
+def rpc_call(url: str, method: str, params: Any, token: Token = None,
+             timeout: Optional[Timeout] = None) -> dict:
+    return get_client(url).call(method, params, token, timeout)
+
+
+def rpc_batch_call(url: str, method: str, params_list: List[Any], token: Token = None,
+                   chunk_size: int = RPC_BATCH_SIZE) -> List[dict]:
+    return get_client(url).batch(method, params_list, token, chunk_size)
+
+
+class AsyncRpcClient:
+    """asyncio variant of `RpcClient`. Requests run on a thread pool as large as the connection
+    pool, so up to `pool_size` calls to the endpoint are in flight at once while the event loop
+    keeps running."""
+
+    def __init__(self, url: str, pool_size: int = POOL_SIZE,
+                 timeout: Timeout = (CONNECT_TIMEOUT, READ_TIMEOUT)):
+        self.client = RpcClient(url, pool_size, timeout)
+        self.executor = ThreadPoolExecutor(max_workers=pool_size)
+
+    async def _run(self, fn, *args) -> Any:
+        return await asyncio.get_running_loop().run_in_executor(self.executor, fn, *args)
+
+    async def post(self, body: Any, token: Token = None, timeout: Optional[Timeout] = None) -> Any:
+        return await self._run(self.client.post, body, token, timeout)
+
+    async def call(self, method: str, params: Any, token: Token = None,
+                   timeout: Optional[Timeout] = None) -> dict:
+        return await self._run(self.client.call, method, params, token, timeout)
+
+    async def batch(self, method: str, params_list: List[Any], token: Token = None,
+                    chunk_size: int = RPC_BATCH_SIZE) -> List[dict]:
+        """Like `RpcClient.batch`, with the chunks sent concurrently."""
+        chunks = [params_list[i:i + chunk_size] for i in range(0, len(params_list), chunk_size)]
+        results = await asyncio.gather(*(self._run(self.client.batch, method, c, token, chunk_size)
+                                         for c in chunks))
+        return [r for chunk in results for r in chunk]
+
+    def close(self) -> None:
+        self.executor.shutdown(wait=False)
+        self.client.close()
+
+    async def __aenter__(self) -> "AsyncRpcClient":
+        return self
+
+    async def __aexit__(self, *exc) -> None:
+        self.close()
@@ -1,12 +1,10 @@
 #!/usr/bin/env python3
 import os
-import time
-import jwt
-import binascii
-import json
-import requests
 import sys
 
+from batchfile import open_batches
+from rpc_client import jwt_provider, rpc_batch_call
+
 # === CONFIGURATION ===
 JWT_SECRET_PATH = "chain_data/jwt-secret"
 CHAIN_ID = 3151908
@@ -22,48 +20,6 @@ if len(sys.argv) < 2:
 
 ENDPOINTS = [f"http://{h}" for h in sys.argv[1:]]
 
-# global counter for JSON-RPC ids
-global_id = 1
-
-def generate_jwt(path):
-    raw = open(path).read().strip()
-    if raw.startswith(("0x", "0X")):
-        raw = raw[2:]
-    key = binascii.unhexlify("".join(c for c in raw if c in "0123456789abcdefABCDEF"))
-    now = int(time.time())
-    token = jwt.encode({"iat": now, "exp": now + 300}, key, algorithm="HS256")
-    return token if isinstance(token, str) else token.decode()
-
-def rpc_call(url, method, params, token):
-    global global_id
-    req_id = global_id; global_id += 1
-    hdr = {
-      "Content-Type": "application/json",
-      "Authorization": f"Bearer {token}"
-    }
-    body = {
-      "jsonrpc": "2.0",
-      "id":      req_id,
-      "method":  method,
-      "params":  params
-    }
-    r = requests.post(url, headers=hdr, json=body)
-    r.raise_for_status()
-    return r.json()
-
-def load_batches():
-    if os.path.exists(BATCH_FILE):
-        try:
-            with open(BATCH_FILE, "r") as f:
-                return json.load(f)
-        except (json.JSONDecodeError, IOError):
-            return {}
-    return {}
-
-def save_batches(batches):
-    os.makedirs(os.path.dirname(BATCH_FILE), exist_ok=True)
-    with open(BATCH_FILE, "w") as f:
-        json.dump(batches, f, indent=2)
 
 def load_marker():
     if os.path.exists(MARKER_FILE):
@@ -80,11 +36,7 @@ def save_marker(count):
         f.write(str(count))
 
 def main():
-    token = generate_jwt(JWT_SECRET_PATH)
-
-    # determine next batch number
-    batches = load_batches()
-    next_batch = max([int(k) for k in batches.keys()] + [0]) + 1
+    token = jwt_provider(JWT_SECRET_PATH)
 
     # load transactions from input file
     with open(RAW_TX_FILE, "r") as f:
@@ -98,24 +50,24 @@ def main():
         print("No more transactions to process.")
         return
 
-    batch_key = str(next_batch)
-
-    for j, raw_hex in enumerate(batch_txs):
-        for url in ENDPOINTS:
-            try:
-                resp = rpc_call(url, "eth_sendRawTransaction", [raw_hex], token)
-                result = resp.get("result") or resp.get("error")
-                print(f"{url}  Tx {j+1} → {raw_hex[:20]}... | {result}")
-            except Exception as e:
-                print(f"Error sending tx {j+1} to {url}: {e}")
-
-    # record batch
-    batches[batch_key] = {
-        "transactions": batch_txs,
-        "blockHash": None
-    }
+    for url in ENDPOINTS:
+        try:
+            responses = rpc_batch_call(url, "eth_sendRawTransaction", [[raw_hex] for raw_hex in batch_txs], token)
+        except Exception as e:
+            print(f"Error sending batch to {url}: {e}")
+            continue
+        for j, (raw_hex, resp) in enumerate(zip(batch_txs, responses)):
+            result = resp.get("result") or resp.get("error")
+            print(f"{url}  Tx {j+1} → {raw_hex[:20]}... | {result}")
+
+    # record batch as the next batch index (*.batches: binary batch file, else JSON object)
+    with open_batches(BATCH_FILE, writable=True, repair=True) as batches:
+        batch_key = batches.append({
+            "transactions": batch_txs,
+            "blockhash": None,
+            "blocknumber": -1
+        })
 
-    save_batches(batches)
     save_marker(end_index)
     print(f"Saved batch {batch_key} with {len(batch_txs)} txs to {BATCH_FILE}")
 
@@ -1,12 +1,11 @@
 #!/usr/bin/env python3
 import os
 import time
-import jwt
-import binascii
 import json
-import requests
 import sys
 
+from rpc_client import jwt_provider, rpc_call
+
 # === CONFIGURATION ===
 JWT_SECRET_PATH = "chain_data/jwt-secret"
 CHAIN_ID = 3151908
@@ -22,34 +21,6 @@ if len(sys.argv) < 2:
 
 ENDPOINTS = [f"http://{h}" for h in sys.argv[1:]]
 
-# global counter for JSON-RPC ids
-global_id = 1
-
-def generate_jwt(path):
-    raw = open(path).read().strip()
-    if raw.startswith(("0x", "0X")):
-        raw = raw[2:]
-    key = binascii.unhexlify("".join(c for c in raw if c in "0123456789abcdefABCDEF"))
-    now = int(time.time())
-    token = jwt.encode({"iat": now, "exp": now + 300}, key, algorithm="HS256")
-    return token if isinstance(token, str) else token.decode()
-
-def rpc_call(url, method, params, token):
-    global global_id
-    req_id = global_id; global_id += 1
-    hdr = {
-      "Content-Type": "application/json",
-      "Authorization": f"Bearer {token}"
-    }
-    body = {
-      "jsonrpc": "2.0",
-      "id":      req_id,
-      "method":  method,
-      "params":  params
-    }
-    r = requests.post(url, headers=hdr, json=body)
-    r.raise_for_status()
-    return r.json()
 
 def load_batches():
     if os.path.exists(BATCH_FILE):
@@ -98,7 +69,7 @@ def send_forkchoice_update(url, parent_hash, timestamp, txs, token):
     return response
 
 def main():
-    token = generate_jwt(JWT_SECRET_PATH)
+    token = jwt_provider(JWT_SECRET_PATH)
 
     # determine next batch number
     batches = load_batches()
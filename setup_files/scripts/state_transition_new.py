@@ -2,9 +2,9 @@
 """
 State Transition Driver for Nethermind (Engine API)
 
-Reads a batches file produced by the ordered-batches extractor. The batches file is a
-JSON **object** keyed by the global batch index (as a string: "0", "1", ...). Each value
-contains:
+Reads a batches file produced by the ordered-batches extractor, through `batchfile.py`: either
+the binary batch format (`*.batches`, read through its mmapped index) or a JSON **object** keyed
+by the global batch index (as a string: "0", "1", ...). Each batch contains:
   {
     cert_id, round, author, batch_digest,
     transactions: ["0x...", ...],
@@ -13,22 +13,38 @@ contains:
   }
 
 This script finds the first entry whose blockhash is empty, asserts that its key (batch index)
-equals the current Nethermind `eth_blockNumber`, then executes the Engine API flow:
+equals the current Nethermind `eth_blockNumber`, then executes the Engine API flow on every
+endpoint **concurrently** (one thread per client):
   - engine_forkchoiceUpdatedV3 (with attributes)
   - engine_getPayloadV4
   - compare payload.transactions to the expected batch transactions
   - engine_newPayloadV4
   - engine_forkchoiceUpdatedV3 (finalize to the new head)
-On success it writes `blockhash` and `blocknumber` back into the batches file **immediately**
-(atomic write), and also logs all RPCs to a log file (atomic write as well).
+As soon as the first client has imported the block it writes `blockhash` and `blocknumber` back
+into the batches file (in place for the binary format; for JSON, a line appended to its journal,
+which is compacted into the file later and on exit). The
+per-client results, each with the time spent in every call, are combined into one verdict for
+the batch; the log file (atomic write) holds all RPCs, the per-client pipelines and the verdict.
+
+With --build-once only the first endpoint builds the block (it alone needs the batch's txs in
+its pool); the other endpoints import that same payload with engine_newPayloadV4 and
+engine_forkchoiceUpdatedV3, concurrently, instead of building their own.
+
+With --daemon the script does not exit after one batch: it stays resident, picks up batches as
+they are appended to the batches file and drives them into blocks continuously, keeping the
+batches file, the connections and the chain head in memory. Progress counters (processed,
+failed, waiting, transactions, last block, blocks/s) are written to `progress.json` next to the
+log after every batch; the log file then holds the latest batch.
 
 Flags:
-  -v / -vv   : increase verbosity (INFO / DEBUG)
+  -v / -vv      : increase verbosity (INFO / DEBUG)
+  --build-once  : build on the first endpoint, import on the others
+  --daemon      : keep running and process batches as they arrive
 
 Exit codes:
   0  success
-  1  batch index does not match current block height or payload mismatch
-  2  general error in flow
+  1  batch index does not match current block height or payload mismatch on any client
+  2  general error in flow on any client
  130 interrupted by user (Ctrl+C)
 """
 
@@ -36,12 +52,12 @@ import sys
 import os
 import time
 import json
-import binascii
 import signal
-from typing import Dict, List, Any
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Dict, List, Any, Optional, Tuple
 
-import jwt
-import requests
+from batchfile import compare_transactions, open_batches
+from rpc_client import jwt_provider, get_client, request_body
 
 # === CONFIGURATION ===
 JWT_SECRET_PATH = "chain_data/jwt-secret"
@@ -51,11 +67,16 @@ os.makedirs(OUTPUT_DIR, exist_ok=True)
 STATE_FILE = os.path.join(OUTPUT_DIR, "state.json")
 BATCH_FILE = os.path.join(OUTPUT_DIR, "ordered_batches_nm.json")
 LOG_FILE   = os.path.join(OUTPUT_DIR, "transition_log.json")
+PROGRESS_FILE = os.path.join(OUTPUT_DIR, "progress.json")
 
-# Global JSON-RPC id & logs
-next_id: int = 1
+# Seconds the daemon waits before looking for a new batch again
+POLL_INTERVAL = 0.2
+
+# Global JSON-RPC logs (of the current batch)
 rpc_log: List[Dict[str, Any]] = []
 pipeline_log: Dict[str, Any] = {}
+# Daemon progress counters
+progress: Dict[str, Any] = {}
 
 # Verbosity (set by -v)
 VERBOSE_LEVEL = 0
@@ -78,17 +99,13 @@ def flush_logs_safely() -> None:
         print(f"[WARN] Failed to write {LOG_FILE}: {e}", file=sys.stderr)
 
 
-def save_batches(batches: Dict[str, dict]) -> None:
-    try:
-        atomic_write_json(BATCH_FILE, batches)
-    except Exception as e:
-        print(f"[WARN] Failed to write {BATCH_FILE}: {e}", file=sys.stderr)
-
 # --------------- Signals -----------------
 
 def on_sigint(signum, frame):
     print("[INFO] Caught Ctrl+C. Flushing logs and exiting...")
     flush_logs_safely()
+    if progress:
+        write_progress()
     # do not lose partial progress in memory: if caller updated batches dict already,
     # it has been saved immediately at that point.
     sys.exit(130)
@@ -102,95 +119,333 @@ def dprint(level: int, *args):
         print(*args)
 
 
-def generate_jwt(path: str) -> str:
-    raw = open(path).read().strip()
-    if raw.startswith(("0x", "0X")):
-        raw = raw[2:]
-    key = binascii.unhexlify("".join(c for c in raw if c in "0123456789abcdefABCDEF"))
-    now = int(time.time())
-    token = jwt.encode({"iat": now, "exp": now + 300}, key, algorithm="HS256")
-    return token if isinstance(token, str) else token.decode()
-
-
 def rpc_call(url: str, method: str, params: Any, jwt_token: str) -> dict:
-    global next_id, rpc_log
-    req_id = next_id; next_id += 1
-    hdr = {
-        "Content-Type":  "application/json",
-        "Authorization": f"Bearer {jwt_token}",
-    }
-    body = {"jsonrpc": "2.0", "id": req_id, "method": method, "params": params}
-    resp = requests.post(url, headers=hdr, json=body, timeout=60)
-    resp.raise_for_status()
-    data = resp.json()
+    global rpc_log
+    body = request_body(method, params)
+    data = get_client(url).post(body, jwt_token)
     rpc_log.append({"url": url, "request": body, "response": data})
     return data
 
 
-def load_batches() -> Dict[str, dict]:
-    if not os.path.exists(BATCH_FILE):
-        return {}
+def load_batches():
     try:
-        raw = json.load(open(BATCH_FILE, "r", encoding="utf-8"))
-        if not isinstance(raw, dict):
-            raise ValueError("batches file must be a JSON object keyed by batch index")
-        # Ensure keys are strings of ints and values dicts
-        out: Dict[str, dict] = {}
-        for k, v in raw.items():
-            out[str(int(k))] = dict(v)
-        return out
+        return open_batches(BATCH_FILE, writable=True)
     except Exception as e:
         print(f"[WARN] Failed to read/parse {BATCH_FILE}: {e}. Starting empty.", file=sys.stderr)
-        return {}
+        return None
+
+
+ZERO32 = "0x" + "0"*64
+
+
+def timed_call(entry: Dict[str, Any], url: str, name: str, method: str, params: Any, token) -> dict:
+    """rpc_call that stores the response and its duration in a pipeline log entry."""
+    t0 = time.monotonic()
+    resp = rpc_call(url, method, params, token)
+    entry["timing"][name] = round(time.monotonic() - t0, 6)
+    entry[name] = resp
+    return resp
+
+
+def finalize(entry: Dict[str, Any], url: str, block_hash: str, token) -> None:
+    fc_state = {
+        "finalizedBlockHash": ZERO32,
+        "headBlockHash":      block_hash,
+        "safeBlockHash":      ZERO32,
+    }
+    timed_call(entry, url, "forkchoiceUpdatedV3_final", "engine_forkchoiceUpdatedV3", [fc_state, None], token)
+
+
+def run_pipeline(url: str, head_hash: str, fc_attr: dict, batch_number: int,
+                 expected_txs: List[str], token) -> Dict[str, Any]:
+    """Build, check, import and finalize the batch's block on one client. Returns its log entry:
+    the RPC responses, `status` (ok / no_payload / mismatch / invalid / error) and `timing`,
+    the seconds spent in each call."""
+    entry: Dict[str, Any] = {"timing": {}}
+    started = time.monotonic()
 
+    def step(name: str, method: str, params: Any) -> dict:
+        return timed_call(entry, url, name, method, params, token)
 
-def first_unprocessed(batches: Dict[str, dict]) -> tuple[str, dict]:
-    """Return (key, item) for first batch where blockhash is falsy. Raise KeyError if none."""
-    for k in sorted(batches, key=lambda x: int(x)):
-        it = batches[k]
-        if not it.get("blockhash"):
-            return k, it
-    raise KeyError("No pending batch to process")
+    try:
+        # 1) forkchoiceUpdatedV3
+        fc_state = {
+            "finalizedBlockHash": ZERO32,
+            "headBlockHash":      head_hash,
+            "safeBlockHash":      ZERO32,
+        }
+        fc = step("forkchoiceUpdatedV3", "engine_forkchoiceUpdatedV3", [fc_state, fc_attr])
+
+        # payloadId
+        pid = None
+        if fc.get("result"):
+            pid = fc["result"].get("payloadId") or fc["result"].get("payloadStatus", {}).get("payloadId")
+        if not pid:
+            entry["status"], entry["error"] = "no_payload", "no payloadId returned"
+            return entry
 
+        # 2) getPayloadV4
+        gp = step("getPayloadV4", "engine_getPayloadV4", [pid])
+        payload = gp.get("result", {})
+        exec_p  = payload.get("executionPayload", {})
+        actual_txs = exec_p.get("transactions", [])
 
-def set_block_fields(item: dict, block_hash: str, block_number_int: int) -> None:
-    item["blockhash"]   = block_hash
-    item["blocknumber"] = int(block_number_int)
+        if VERBOSE_LEVEL >= 2:
+            print(f"{url} actual txs:", actual_txs)
+            print(f"{url} expected txs:", expected_txs)
+
+        # 3) compare txs (in order; hex case is ignored)
+        entry["compare"] = compare_transactions(expected_txs, actual_txs)
+        if not entry["compare"]["match"]:
+            entry["status"] = "mismatch"
+            return entry
+
+        # 4) newPayloadV4
+        np_params = [exec_p,
+                     payload.get("blobsBundle", {}).get("blobs", []),
+                     ZERO32,
+                     []]
+        np = step("newPayloadV4", "engine_newPayloadV4", np_params)
+        res = np.get("result", {})
+        status = res.get("status") or res.get("latestValidHash")
+        if not status or status not in ("VALID", "ACCEPTED"):
+            entry["status"], entry["newPayloadV4_error"] = "invalid", res
+            return entry
+
+        entry["blockHash"]   = exec_p["blockHash"]
+        entry["blockNumber"] = int(exec_p.get("blockNumber", hex(batch_number)), 16)
+        # kept for --build-once, which hands the payload to the other clients (not logged)
+        entry["_newPayloadParams"] = np_params
+
+        # 5) finalize head
+        finalize(entry, url, entry["blockHash"], token)
+        entry["status"] = "ok"
+    except Exception as e:
+        entry["status"], entry["error"] = "error", str(e)
+    finally:
+        entry["timing"]["total"] = round(time.monotonic() - started, 6)
+    return entry
+
+
+def run_import(url: str, np_params: list, block_hash: str, block_number: int, token) -> Dict[str, Any]:
+    """Import a payload built by another client and make it head. Returns a log entry shaped
+    like run_pipeline's."""
+    entry: Dict[str, Any] = {"timing": {}, "imported": True}
+    started = time.monotonic()
+    try:
+        np = timed_call(entry, url, "newPayloadV4", "engine_newPayloadV4", np_params, token)
+        res = np.get("result", {})
+        if res.get("status") not in ("VALID", "ACCEPTED"):
+            entry["status"], entry["newPayloadV4_error"] = "invalid", res
+            return entry
+        entry["blockHash"], entry["blockNumber"] = block_hash, block_number
+        finalize(entry, url, block_hash, token)
+        entry["status"] = "ok"
+    except Exception as e:
+        entry["status"], entry["error"] = "error", str(e)
+    finally:
+        entry["timing"]["total"] = round(time.monotonic() - started, 6)
+    return entry
+
+
+Head = Tuple[str, int, int]  # blockhash, blocknumber, timestamp
+
+
+def process_batch(batches, batch_number: int, endpoints: List[str], token, build_once: bool,
+                  head: Optional[Head] = None) -> Tuple[int, Optional[Head]]:
+    """Turn batch `batch_number` into a block on every endpoint, on top of `head` (read from the
+    first endpoint if not given). Returns (exit code, the new head or None)."""
+    rpc_log.clear()
+    pipeline_log.clear()
+    expected_txs = batches.transactions(batch_number)
+    print(f"Processing batch #{batch_number} with {len(expected_txs)} txs...")
+
+    # Default feeRecipient
+    feeRecipient = "0xE25583099BA105D9ec0A67f5Ae86D90e50036425"
+
+    if head is None:
+        latest = rpc_call(endpoints[0], "eth_getBlockByNumber", ["latest", False], token)["result"]
+        head = (latest["hash"], int(latest["number"], 16), int(latest["timestamp"], 16))
+    head_hash = head[0]
+    # Blocks built back to back must still have increasing timestamps
+    now_hex  = hex(max(int(time.time()), head[2] + 1))
+
+    fc_attr = {
+        "parentBeaconBlockRoot": ZERO32,
+        "timestamp":             now_hex,
+        "prevRandao":            ZERO32,
+        "suggestedFeeRecipient": feeRecipient,
+        "withdrawals":           [],
+    }
+
+    # Run the five-call pipeline on all clients at once; record the block as soon as one of
+    # them has imported it. With --build-once only the first client builds, and the others
+    # import its payload once it is VALID there.
+    recorded = None
+    builders = endpoints[:1] if build_once else endpoints
+    with ThreadPoolExecutor(max_workers=len(endpoints)) as pool:
+        futures = {
+            pool.submit(run_pipeline, url, head_hash, fc_attr, batch_number, expected_txs, token): url
+            for url in builders
+        }
+        while futures:
+            for fut in as_completed(futures):
+                url = futures.pop(fut)
+                entry = fut.result()
+                np_params = entry.pop("_newPayloadParams", None)
+                pipeline_log[url] = entry
+                dprint(1, f"[INFO] {url}: {entry['status']} in {entry['timing']['total']:.3f}s")
+                if entry["status"] != "ok":
+                    continue
+                if recorded is None:
+                    recorded = (entry["blockHash"], entry["blockNumber"])
+                    try:
+                        batches.set_block(batch_number, *recorded)
+                    except Exception as e:
+                        print(f"[WARN] Failed to write {BATCH_FILE}: {e}", file=sys.stderr)
+                if build_once and np_params is not None:
+                    for other in endpoints[1:]:
+                        futures[pool.submit(run_import, other, np_params, *recorded, token)] = other
+                break
+
+    # One verdict for the batch
+    for url in endpoints:
+        pipeline_log.setdefault(url, {"status": "not_run", "timing": {"total": 0.0}})
+    statuses = {url: pipeline_log[url]["status"] for url in endpoints}
+    hashes = {pipeline_log[url].get("blockHash") for url in endpoints if statuses[url] == "ok"}
+    pipeline_log["verdict"] = {
+        "batch": batch_number,
+        "ok": all(st == "ok" for st in statuses.values()),
+        "statuses": statuses,
+        "blockHash": recorded[0] if recorded else None,
+        "consistent": len(hashes) <= 1,
+        "timing": {url: pipeline_log[url]["timing"]["total"] for url in endpoints},
+        "transactions": len(expected_txs),
+    }
+    flush_logs_safely()
+
+    if len(hashes) > 1:
+        print(f"[ERROR] Batch {batch_number} produced different block hashes: {sorted(hashes)}")
+        return 2, None
+    for url, st in statuses.items():
+        if st == "not_run":
+            print(f"[ERROR] Batch {batch_number} was not imported on {url}: the builder failed.")
+        elif st == "mismatch":
+            diff = pipeline_log[url]["compare"]
+            print(f"[ERROR] Batch {batch_number} TXs did not match execution payload on {url}: "
+                  f"first difference at index {diff['first_mismatch']}, {diff['missing']} missing, "
+                  f"{diff['extra']} extra{', reordered' if diff['reordered'] else ''}.")
+        elif st == "invalid":
+            print(f"[ERROR] newPayloadV4 was not VALID/ACCEPTED on {url}.")
+        elif st != "ok":
+            print(f"[ERROR] Batch {batch_number} failed on {url}: {pipeline_log[url].get('error')}")
+    if "mismatch" in statuses.values():
+        return 1, None
+    if not pipeline_log["verdict"]["ok"]:
+        return 2, None
+
+    print(f"Batch {batch_number} processed. Logs → {LOG_FILE}")
+    return 0, (recorded[0], recorded[1], int(now_hex, 16))
+
+
+
+def chain_height(endpoints: List[str], token, head: Optional[Head]) -> int:
+    """Current block number: the daemon's last block if it has one, else the client's."""
+    if head is not None:
+        return head[1]
+    return int(rpc_call(endpoints[0], "eth_blockNumber", [], token)["result"], 16)
+
+
+def write_progress() -> None:
+    progress["uptime_s"] = round(time.monotonic() - progress["started"], 3)
+    elapsed = progress["uptime_s"] or 1.0
+    progress["blocks_per_s"] = round(progress["processed"] / elapsed, 3)
+    try:
+        atomic_write_json(PROGRESS_FILE, {k: v for k, v in progress.items() if k != "started"})
+    except Exception as e:
+        print(f"[WARN] Failed to write {PROGRESS_FILE}: {e}", file=sys.stderr)
+
+
+def run_daemon(batches, endpoints: List[str], token, build_once: bool) -> int:
+    """Drive blocks continuously: take the next pending batch as soon as it is in the batches
+    file and the chain is at its height, keeping the batches file, the connections and the head
+    in memory between blocks. Progress counters go to PROGRESS_FILE after every batch."""
+    progress.update({
+        "started": time.monotonic(), "processed": 0, "failed": 0, "waiting": 0,
+        "transactions": 0, "next_batch": None, "last_block": None, "last_block_hash": None,
+    })
+    head: Optional[Head] = None
+    print(f"[INFO] Daemon started on {', '.join(endpoints)}. Progress → {PROGRESS_FILE}")
+    while True:
+        batches.refresh()
+        batch_number = batches.first_unprocessed()
+        if batch_number != progress["next_batch"]:
+            progress["next_batch"] = batch_number
+            write_progress()
+        if batch_number is None:
+            time.sleep(POLL_INTERVAL)
+            continue
+
+        height = chain_height(endpoints, token, head)
+        if batch_number != height:
+            dprint(1, f"[INFO] Batch {batch_number} waits for block height {height} to match.")
+            progress["waiting"] += 1
+            head = None
+            time.sleep(POLL_INTERVAL)
+            continue
+
+        code, head = process_batch(batches, batch_number, endpoints, token, build_once, head)
+        if code == 0:
+            progress["processed"] += 1
+            progress["transactions"] += pipeline_log["verdict"]["transactions"]
+            progress["last_block"], progress["last_block_hash"] = head[1], head[0]
+        else:
+            progress["failed"] += 1
+            time.sleep(POLL_INTERVAL)
+        write_progress()
+        dprint(1, f"[INFO] processed={progress['processed']} failed={progress['failed']} "
+                  f"next={batches.first_unprocessed()} {progress['blocks_per_s']} blocks/s")
 
 
 # --------------- Main ----------------
 
-def parse_args(argv: List[str]) -> tuple[List[str], int]:
-    """Return (endpoints, verbose_level) from argv.
-       Usage: state_transition_main.py [-v|-vv] <host1:port> [host2:port ...]
+def parse_args(argv: List[str]) -> tuple[List[str], int, bool, bool]:
+    """Return (endpoints, verbose_level, build_once, daemon) from argv.
+       Usage: state_transition_new.py [-v|-vv] [--build-once] [--daemon] <host1:port> [host2:port ...]
     """
     v = 0
+    build_once = False
+    daemon = False
     eps: List[str] = []
     for a in argv:
         if a == "-v":
             v = max(v, 1)
         elif a == "-vv":
             v = max(v, 2)
+        elif a == "--build-once":
+            build_once = True
+        elif a == "--daemon":
+            daemon = True
         else:
             eps.append(a)
-    return eps, v
+    return eps, v, build_once, daemon
 
 
 def main() -> int:
     global VERBOSE_LEVEL
 
     if len(sys.argv) < 2:
-        print("Usage: python3 state_transition_main.py [-v|-vv] <host1:port> [host2:port ...]")
+        print("Usage: python3 state_transition_new.py [-v|-vv] [--build-once] [--daemon] <host1:port> [host2:port ...]")
         return 1
 
-    arg_eps, VERBOSE_LEVEL = parse_args(sys.argv[1:])
+    arg_eps, VERBOSE_LEVEL, build_once, daemon = parse_args(sys.argv[1:])
     if not arg_eps:
         print("error: no endpoints provided")
         return 1
 
     ENDPOINTS = [f"http://{h}" for h in arg_eps]
 
-    token = generate_jwt(JWT_SECRET_PATH)
+    token = jwt_provider(JWT_SECRET_PATH)
 
     # === Bootstrap state file if missing ===
     if not os.path.exists(STATE_FILE):
@@ -201,128 +456,37 @@ def main() -> int:
         atomic_write_json(STATE_FILE, {"chainId": chain_id, "genesisHash": genesis})
         dprint(1, f"[INFO] Initialized state: chainId={chain_id}, genesis={genesis}")
 
-    # === Load batches (dict keyed by batch index) ===
+    # === Load batches (keyed by batch index) ===
     batches = load_batches()
-    if not batches:
+    if not batches and not daemon:
         print("No batches file or it is empty. Nothing to do.")
         return 0
+    while batches is None:
+        # the daemon waits for the extractor to create the file
+        time.sleep(POLL_INTERVAL)
+        batches = load_batches()
 
+    # JSON batches are compacted on the way out, so the file itself shows the recorded blocks
     try:
-        batch_key, item = first_unprocessed(batches)
-    except KeyError:
-        print("No pending batch to process.")
-        return 0
-
-    batch_number = int(batch_key)
-    expected_txs = item.get("transactions") or []
-
-    latest_block_number = int(rpc_call(ENDPOINTS[0], "eth_blockNumber", [], token)["result"], 16)
-    if batch_number != latest_block_number:
-        print(f"[INFO] Batch {batch_number} does not match current block number {latest_block_number}.")
-        print("       Waiting for Nethermind to be at the same height. Exiting.")
-        flush_logs_safely()
-        return 1
-
-    print(f"Processing batch #{batch_number} with {len(expected_txs)} txs...")
-
-    zero32   = "0x" + "0"*64
-    now_hex  = hex(int(time.time()))
-    # Default feeRecipient
-    feeRecipient = "0xE25583099BA105D9ec0A67f5Ae86D90e50036425"
-
-    latest   = rpc_call(ENDPOINTS[0], "eth_getBlockByNumber", ["latest", False], token)
-    head_hash = latest["result"]["hash"]
-
-    for url in ENDPOINTS:
-        entry: Dict[str, Any] = {}
-
-        # 1) forkchoiceUpdatedV3
-        fc_state = {
-            "finalizedBlockHash": zero32,
-            "headBlockHash":      head_hash,
-            "safeBlockHash":      zero32,
-        }
-        fc_attr  = {
-            "parentBeaconBlockRoot": zero32,
-            "timestamp":             now_hex,
-            "prevRandao":            zero32,
-            "suggestedFeeRecipient": feeRecipient,
-            "withdrawals":           [],
-        }
-        fc = rpc_call(url, "engine_forkchoiceUpdatedV3", [fc_state, fc_attr], token)
-        entry["forkchoiceUpdatedV3"] = fc
-
-        # payloadId
-        pid = None
-        if fc.get("result"):
-            pid = fc["result"].get("payloadId") or fc["result"].get("payloadStatus", {}).get("payloadId")
-        if not pid:
-            entry["error"] = "no payloadId returned"
-            pipeline_log[url] = entry
-            continue
-
-        # 2) getPayloadV4
-        gp = rpc_call(url, "engine_getPayloadV4", [pid], token)
-        entry["getPayloadV4"] = gp
-
-        payload = gp.get("result", {})
-        exec_p  = payload.get("executionPayload", {})
-        actual_txs = exec_p.get("transactions", [])
-
-        if VERBOSE_LEVEL >= 2:
-            print("actual txs:", actual_txs)
-            print("expected txs:", expected_txs)
-
-        # 3) compare txs
-        match = (actual_txs == expected_txs)
-        entry["compare"] = {"expected_count": len(expected_txs), "actual_count": len(actual_txs), "match": match}
-        if not match:
-            pipeline_log[url] = entry
+        if daemon:
+            return run_daemon(batches, ENDPOINTS, token, build_once)
+
+        batch_number = batches.first_unprocessed()
+        if batch_number is None:
+            print("No pending batch to process.")
+            return 0
+
+        latest_block_number = chain_height(ENDPOINTS, token, None)
+        if batch_number != latest_block_number:
+            print(f"[INFO] Batch {batch_number} does not match current block number {latest_block_number}.")
+            print("       Waiting for Nethermind to be at the same height. Exiting.")
             flush_logs_safely()
-            print(f"[ERROR] Batch {batch_number} TXs did not match execution payload on {url}.")
             return 1
 
-        # 4) newPayloadV4
-        np = rpc_call(url, "engine_newPayloadV4",
-                      [exec_p,
-                       payload.get("blobsBundle", {}).get("blobs", []),
-                       zero32,
-                       []],
-                      token)
-        entry["newPayloadV4"] = np
-
-        res = np.get("result", {})
-        status = res.get("status") or res.get("latestValidHash")
-        if not status or status not in ("VALID", "ACCEPTED"):
-            entry["newPayloadV4_error"] = res
-            pipeline_log[url] = entry
-            flush_logs_safely()
-            print(f"[ERROR] newPayloadV4 was not VALID/ACCEPTED on {url}.")
-            return 2
-
-        block_hash   = exec_p["blockHash"]
-        block_number = int(exec_p.get("blockNumber", hex(batch_number)), 16)
-
-        # Record immediately
-        set_block_fields(item, block_hash, block_number)
-        batches[str(batch_number)] = item
-        save_batches(batches)
-
-        # 5) finalize head
-        fc2_state = {
-            "finalizedBlockHash": zero32,
-            "headBlockHash":      block_hash,
-            "safeBlockHash":      zero32,
-        }
-        fc2 = rpc_call(url, "engine_forkchoiceUpdatedV3", [fc2_state, None], token)
-        entry["forkchoiceUpdatedV3_final"] = fc2
-
-        pipeline_log[url] = entry
-
-    # write full log
-    flush_logs_safely()
-    print(f"Batch {batch_number} processed. Logs → {LOG_FILE}")
-    return 0
+        code, _ = process_batch(batches, batch_number, ENDPOINTS, token, build_once)
+        return code
+    finally:
+        batches.close(compact=True)
 
 
 if __name__ == "__main__":
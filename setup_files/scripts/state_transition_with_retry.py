@@ -1,6 +1,7 @@
 #!/usr/bin/env python3
-import sys, os, time, json, binascii
-import jwt, requests
+import sys, os, time, json
+
+from rpc_client import jwt_provider, get_client, request_body
 
 MAX_RETRIES = 5
 RETRY_DELAY_SEC = 5.0
@@ -14,32 +15,14 @@ STATE_FILE = os.path.join(OUTPUT_DIR, "state.json")
 BATCH_FILE = os.path.join(OUTPUT_DIR, "transactions_batch.json")
 LOG_FILE = os.path.join(OUTPUT_DIR, "transition_log.json")
 
-# global JSON-RPC id & call log
-next_id = 1
+# global JSON-RPC call log
 rpc_log = []
 
 
-def generate_jwt(path):
-    raw = open(path).read().strip()
-    if raw.startswith(("0x", "0X")):
-        raw = raw[2:]
-    key = binascii.unhexlify("".join(c for c in raw if c in "0123456789abcdefABCDEF"))
-    now = int(time.time())
-    token = jwt.encode({"iat": now, "exp": now + 300}, key, algorithm="HS256")
-    return token if isinstance(token, str) else token.decode()
-
-
 def rpc_call(url, method, params, jwt_token):
-    global next_id, rpc_log
-    req_id = next_id; next_id += 1
-    hdr = {
-        "Content-Type": "application/json",
-        "Authorization": f"Bearer {jwt_token}"
-    }
-    body = {"jsonrpc": "2.0", "id": req_id, "method": method, "params": params}
-    resp = requests.post(url, headers=hdr, json=body)
-    resp.raise_for_status()
-    data = resp.json()
+    global rpc_log
+    body = request_body(method, params)
+    data = get_client(url).post(body, jwt_token)
     rpc_log.append({"url": url, "request": body, "response": data})
     return data
 
@@ -64,7 +47,7 @@ def main():
         sys.exit(1)
     endpoints = [f"http://{h}" for h in sys.argv[1:]]
 
-    token = generate_jwt(JWT_SECRET_PATH)
+    token = jwt_provider(JWT_SECRET_PATH)
 
     # Bootstrap state file
     if not os.path.exists(STATE_FILE):
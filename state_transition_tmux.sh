@@ -10,16 +10,16 @@ start() {
     echo "Starting tmux session: $SESSION"
 
     tmux new-session -d -s "$SESSION" -n "node0" \
-      "bash -c 'python3 nm_state_transition_with_retry3.py Output/transactions_batch_node_0.json Output/transition_log_node_0.json 127.0.0.1:8545; echo \"[node0 exited] Press Enter to close...\"; read'"
+      "bash -c 'python3 nm_state_transition_with_retry3.py Output/transactions_batch_node_0.batches Output/transition_log_node_0.json 127.0.0.1:8545; echo \"[node0 exited] Press Enter to close...\"; read'"
 
     tmux new-window -t "$SESSION" -n "node1" \
-      "bash -c 'python3 nm_state_transition_with_retry3.py Output/transactions_batch_node_1.json Output/transition_log_node_1.json 127.0.0.1:8546; echo \"[node1 exited] Press Enter to close...\"; read'"
+      "bash -c 'python3 nm_state_transition_with_retry3.py Output/transactions_batch_node_1.batches Output/transition_log_node_1.json 127.0.0.1:8546; echo \"[node1 exited] Press Enter to close...\"; read'"
 
     tmux new-window -t "$SESSION" -n "node2" \
-      "bash -c 'python3 nm_state_transition_with_retry3.py Output/transactions_batch_node_2.json Output/transition_log_node_2.json 127.0.0.1:8547; echo \"[node2 exited] Press Enter to close...\"; read'"
+      "bash -c 'python3 nm_state_transition_with_retry3.py Output/transactions_batch_node_2.batches Output/transition_log_node_2.json 127.0.0.1:8547; echo \"[node2 exited] Press Enter to close...\"; read'"
 
     tmux new-window -t "$SESSION" -n "node3" \
-      "bash -c 'python3 nm_state_transition_with_retry3.py Output/transactions_batch_node_3.json Output/transition_log_node_3.json 127.0.0.1:8548; echo \"[node3 exited] Press Enter to close...\"; read'"
+      "bash -c 'python3 nm_state_transition_with_retry3.py Output/transactions_batch_node_3.batches Output/transition_log_node_3.json 127.0.0.1:8548; echo \"[node3 exited] Press Enter to close...\"; read'"
 
     tmux attach -t "$SESSION"
 }